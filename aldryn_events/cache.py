@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .conf import settings
+
+GENERATION_CACHE_KEY = 'aldryn_events:generation'
+CONFIG_VERSION_CACHE_KEY = 'aldryn_events:config_version'
+
+# process-local hit/miss counters, keyed by the name of the cached structure
+_stats = {}
+
+# process-local namespace -> EventsConfig (or None), valid for one version
+_configs = {}
+_configs_lock = threading.Lock()
+_configs_version = [None]
+
+
+def get_counter(key):
+    value = cache.get(key)
+    if value is None:
+        # start from the current time, so that an evicted counter never
+        # goes back to a value which was already used
+        value = int(time.time() * 1000)
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+    return value
+
+
+def bump_counter(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # key does not exist (anymore), a fresh one is good enough
+        return get_counter(key)
+
+
+def get_generation():
+    """
+    Returns the current events generation. It changes every time an event,
+    an event translation or an events config is saved or deleted, so it can
+    be used as a part of cache keys of anything built from events.
+    """
+    return get_counter(GENERATION_CACHE_KEY)
+
+
+def bump_generation():
+    """
+    Invalidates everything cached with get_generation() in its key.
+    Returns the new generation.
+    """
+    return bump_counter(GENERATION_CACHE_KEY)
+
+
+def on_commit(func, using=None):
+    """
+    Runs func once the current transaction of using is committed (right away
+    outside of transactions), so that caches are not rebuilt from changes
+    which are not visible to other connections yet. Django < 1.9 has no
+    transaction.on_commit, func runs right away there.
+    """
+    if hasattr(transaction, 'on_commit'):
+        transaction.on_commit(func, using=using)
+    else:
+        func()
+
+
+def get_config_version():
+    """
+    Returns the current version of the events configs, it changes every time
+    an events config or its translation is saved or deleted.
+    """
+    return get_counter(CONFIG_VERSION_CACHE_KEY)
+
+
+def bump_config_version():
+    return bump_counter(CONFIG_VERSION_CACHE_KEY)
+
+
+def get_config(namespace):
+    """
+    Returns the EventsConfig of namespace, or None if there is none.
+    Configs are kept in a process-local cache which is dropped as soon as
+    the config version changes, in any process.
+    """
+    from .models import EventsConfig
+
+    version = get_config_version()
+    with _configs_lock:
+        if _configs_version[0] != version:
+            _configs.clear()
+            _configs_version[0] = version
+        if namespace in _configs:
+            record_cache_access('config', hit=True)
+            return _configs[namespace]
+    record_cache_access('config', hit=False)
+    config = EventsConfig.objects.filter(namespace=namespace).first()
+    with _configs_lock:
+        if _configs_version[0] == version:
+            _configs[namespace] = config
+    return config
+
+
+def make_cache_key(name, *parts):
+    return ':'.join(
+        ['aldryn_events', name] + ['{0}'.format(part) for part in parts])
+
+
+def get_or_build(name, key_parts, build, timeout):
+    """
+    Returns the value cached under name and key_parts (the events generation
+    is added to the key) or builds it with the build callable and caches it.
+    timeout may be a callable, it is only called when the value is built.
+    """
+    key = make_cache_key(name, get_generation(), *key_parts)
+    value = cache.get(key)
+    if value is not None:
+        record_cache_access(name, hit=True)
+        return value
+    record_cache_access(name, hit=False)
+    value = build()
+    if callable(timeout):
+        timeout = timeout()
+    if timeout:
+        cache.set(key, value, timeout)
+    return value
+
+
+def record_cache_access(name, hit):
+    counters = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+    counters['hits' if hit else 'misses'] += 1
+
+
+def get_cache_stats():
+    """
+    Returns hit and miss counts of this process, e.g.
+    {'navigation': {'hits': 12, 'misses': 2}}
+    """
+    return dict((name, dict(counters)) for name, counters in _stats.items())
+
+
+def reset_cache_stats():
+    _stats.clear()
+
+
+def seconds_until(moment, now=None):
+    now = now or timezone.now()
+    return max(int(math.ceil((moment - now).total_seconds())), 1)
+
+
+def get_next_day(now=None):
+    """
+    Returns the start of the next day. Events move from future to archive
+    when the day rolls over, and the navigation changes its current month
+    with the first day of the next month.
+    """
+    now = now or timezone.now()
+    return (now + datetime.timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_publish_at(namespace, now=None):
+    """
+    Returns the nearest publish_at of the events of namespace which are not
+    published yet, or None.
+    """
+    from .models import Event
+
+    now = now or timezone.now()
+    aggregate = (Event.objects.namespace(namespace)
+                              .filter(is_published=True, publish_at__gt=now)
+                              .aggregate(next_publish_at=Min('publish_at')))
+    return aggregate['next_publish_at']
+
+
+def get_navigation_cache_timeout(namespace, now=None):
+    """
+    Returns the amount of seconds for which the navigation of namespace is
+    valid: until the next day, or until the next event gets published,
+    capped by ALDRYN_EVENTS_NAVIGATION_CACHE_TIMEOUT.
+    """
+    return get_events_cache_timeout(
+        namespace, settings.ALDRYN_EVENTS_NAVIGATION_CACHE_TIMEOUT, now)
+
+
+def get_events_cache_timeout(namespace, max_timeout, now=None):
+    """
+    Returns the amount of seconds for which something built from the
+    published events of namespace is valid: until the next day, or until the
+    next event gets published, capped by max_timeout (0 if it is falsy).
+    """
+    if not max_timeout:
+        return 0
+    now = now or timezone.now()
+    boundaries = [get_next_day(now)]
+    next_publish_at = get_next_publish_at(namespace, now)
+    if next_publish_at is not None:
+        boundaries.append(next_publish_at)
+    return min(seconds_until(min(boundaries), now), max_timeout)
@@ -2,7 +2,10 @@
 
 from __future__ import unicode_literals
 
+import datetime
+
 from django.core.urlresolvers import NoReverseMatch
+from django.utils import timezone
 from django.utils.translation import (
     get_language_from_request,
     ugettext_lazy as _,
@@ -10,22 +13,23 @@ from django.utils.translation import (
 
 from cms.menu_bases import CMSAttachMenu
 from cms.apphook_pool import apphook_pool
-from menus.base import NavigationNode
+from menus.base import Modifier, NavigationNode
 from menus.menu_pool import menu_pool
 
-from .models import Event
+from . import request_events_event_identifier
+from .cache import get_events_cache_timeout, get_or_build
+from .conf import settings
+from .listings import use_listings
+from .models import Event, EventListing
+from .utils import get_event_urls
 
 
 class EventsMenu(CMSAttachMenu):
     name = _('Events')
 
     def get_nodes(self, request):
-        nodes = []
         language = get_language_from_request(request, check_path=True)
-        events = (Event.objects.published()
-                               .language(language)
-                               .active_translations(language))
-
+        namespace = None
         if hasattr(self, 'instance') and self.instance:
             # If self has a property `instance`, then we're using django CMS
             # 3.0.12 or later, which supports using CMSAttachMenus on multiple,
@@ -33,23 +37,113 @@ class EventsMenu(CMSAttachMenu):
             # here we modify the queryset to reflect this.
             app = apphook_pool.get_apphook(self.instance.application_urls)
             if app:
-                events = events.namespace(self.instance.application_namespace)
+                namespace = self.instance.application_namespace
+        if namespace is None:
+            return self.build_nodes(language, namespace)
+        key_parts = (namespace, language, use_listings(),
+                     settings.ALDRYN_EVENTS_MENU_UPCOMING_COUNT,
+                     settings.ALDRYN_EVENTS_MENU_UPCOMING_DAYS)
+        return get_or_build(
+            'menu', key_parts,
+            lambda: self.build_nodes(language, namespace),
+            lambda: get_events_cache_timeout(
+                namespace, settings.ALDRYN_EVENTS_MENU_CACHE_TIMEOUT))
 
-        for event in events:
-            try:
-                url = event.get_absolute_url(language=language)
-            except NoReverseMatch:
-                url = None
+    def build_nodes(self, language, namespace=None):
+        if use_listings():
+            events = EventListing.objects.filter(language=language)
+        else:
+            events = (Event.objects.language(language)
+                                   .active_translations(language)
+                                   .for_listing(projection='menu'))
+        if namespace is not None:
+            events = events.namespace(namespace)
+        events = self.limit_events(events)
 
+        if use_listings():
+            return [NavigationNode(event.title, event.url, event.event_id)
+                    for event in events if event.url]
+        nodes = []
+        urls = get_event_urls(events, language)
+        for event in events:
+            url = urls[event.pk]
             if url:
-                node = NavigationNode(
-                    event.title,
-                    event.get_absolute_url(language=language),
-                    event.pk,
-                )
+                node = NavigationNode(event.title, url, event.pk)
                 nodes.append(node)
 
         return nodes
 
+    def limit_events(self, events):
+        """
+        Returns the published events, or only the next upcoming events if
+        ALDRYN_EVENTS_MENU_UPCOMING_COUNT or ALDRYN_EVENTS_MENU_UPCOMING_DAYS
+        is set.
+        """
+        count = settings.ALDRYN_EVENTS_MENU_UPCOMING_COUNT
+        days = settings.ALDRYN_EVENTS_MENU_UPCOMING_DAYS
+        if count is None and days is None:
+            return list(events.published())
+        now = timezone.now()
+        latest_first = not events.query.standard_ordering
+        events = events.future(now=now)
+        if latest_first:
+            # the nearest events are the upcoming ones
+            events = events.reverse()
+        if days is not None:
+            events = events.filter(
+                start_date__lte=now.date() + datetime.timedelta(days=days))
+        if count is not None:
+            events = events[:count]
+        events = list(events)
+        if latest_first:
+            events.reverse()
+        return events
+
+
+class EventsMenuModifier(Modifier):
+    """
+    Adds the event shown by the detail view below its apphook page, if the
+    events menu only lists upcoming events and left it out, so that
+    breadcrumbs reach it anyway.
+    """
+
+    def modify(self, request, nodes, namespace, root_id, post_cut,
+               breadcrumb):
+        if post_cut or (
+                settings.ALDRYN_EVENTS_MENU_UPCOMING_COUNT is None and
+                settings.ALDRYN_EVENTS_MENU_UPCOMING_DAYS is None):
+            return nodes
+        event = getattr(request, request_events_event_identifier, None)
+        page = getattr(request, 'current_page', None)
+        if event is None or page is None:
+            return nodes
+        parent = next((node for node in nodes
+                       if node.attr.get('is_page') and node.id == page.pk),
+                      None)
+        if parent is None:
+            return nodes
+        menu_names = [
+            name for name in parent.attr.get('navigation_extenders') or []
+            if name.split(':')[0] == EventsMenu.__name__]
+        if not menu_names:
+            return nodes
+        if any(node.namespace in menu_names and node.id == event.pk
+               for node in nodes):
+            return nodes
+        try:
+            url = event.get_absolute_url()
+        except NoReverseMatch:
+            return nodes
+        node = NavigationNode(event.get_title(), url, event.pk)
+        node.namespace = menu_names[0]
+        node.parent_namespace = parent.namespace
+        node.parent_id = parent.id
+        node.parent = parent
+        node.selected = node.is_selected(request)
+        parent.children.append(node)
+        nodes.append(node)
+        return nodes
+
 
 menu_pool.register_menu(EventsMenu)
+menu_pool.register_modifier(EventsMenuModifier)
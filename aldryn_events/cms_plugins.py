@@ -6,21 +6,25 @@ import datetime
 
 from distutils.version import LooseVersion
 
-from django.contrib.sites.shortcuts import get_current_site
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import NoReverseMatch, reverse
 from django.utils import timezone
 from django.utils.dates import MONTHS
-from django.utils.translation import ugettext_lazy as _, get_language_from_request
+from django.utils.translation import ugettext_lazy as _
 
 from cms import __version__ as cms_version
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 
-from .utils import (
-    build_calendar, is_valid_namespace_for_language,
-    get_valid_languages,
-)
+from .cache import get_events_cache_timeout, get_or_build
+from .conf import settings
+from .listings import use_listings
+from .loader import get_loader
+from .managers import apply_namespace_ordering
+from .utils import build_calendar, get_calendar_dates
 from .models import (
-    UpcomingPluginItem, Event, EventListPlugin, EventCalendarPlugin
+    UpcomingPluginItem, Event, EventListing, EventListPlugin,
+    EventCalendarPlugin
 )
 
 from .forms import (
@@ -45,21 +49,18 @@ class NameSpaceCheckMixin(object):
         return ''
 
     def get_language(self, request):
-        return get_language_from_request(request, check_path=True)
+        return get_loader(request).get_language()
 
     def render(self, context, instance, placeholder):
         # translated filter the events, language set current language
         namespace = self.get_namespace(instance)
-        language = self.get_language(context['request'])
-        self.valid_languages = get_valid_languages(namespace, language)
-        # check if we can reverse list view for configured namespace
-        # if no prepare a message to admin users.
-        valid = False
-        for lang_code in self.valid_languages:
-            if is_valid_namespace_for_language(namespace, lang_code):
-                valid = True
-                break
-        if not valid:
+        loader = get_loader(context['request'])
+        language = loader.get_language()
+        self.valid_languages = loader.get_valid_languages(namespace, language)
+        # valid languages are the ones we can reverse the list view of the
+        # configured namespace for, if there is none prepare a message to
+        # admin users.
+        if not self.valid_languages:
             # add message, should be properly handled in template
             context['plugin_configuration_error'] = NO_APPHOOK_ERROR_MESSAGE
         return super(NameSpaceCheckMixin, self).render(
@@ -71,12 +72,25 @@ class AdjustableCacheMixin(object):
     For django CMS < 3.3.0 installations, we have no choice but to disable the
     cache where there is time-sensitive information. However, in later CMS
     versions, we can configure it with `get_cache_expiration()`.
+
+    The content only changes when the day rolls over (events move from
+    future to past, the calendar highlights another day and eventually shows
+    another month) or when the next event of the namespace gets published,
+    so it expires at the earliest of those, capped by cache_duration.
     """
     if not CMS_GTE_330:
         cache = False
 
     def get_cache_expiration(self, request, instance, placeholder):
-        return getattr(instance, 'cache_duration', 0)
+        if getattr(instance, 'deferred', False):
+            # the placeholder of the content does not change with the events
+            return None
+        return self.get_content_expiration(instance)
+
+    def get_content_expiration(self, instance):
+        return get_events_cache_timeout(
+            self.get_namespace(instance),
+            getattr(instance, 'cache_duration', 0))
 
     def get_fieldsets(self, request, obj=None):
         """
@@ -96,8 +110,76 @@ class AdjustableCacheMixin(object):
         return fieldsets
 
 
+class EventsCacheMixin(object):
+    """
+    Caches the events a plugin renders per plugin instance (and its last
+    change), namespace and language until an event changes (see
+    `cache.get_generation`), the day rolls over or the next event gets
+    published, capped by ALDRYN_EVENTS_PLUGIN_CACHE_TIMEOUT. Requests of
+    editors (showing the toolbar) are not cached.
+
+    `prerender()` builds the cached events of a language ahead of the
+    requests, see `aldryn_events.prerender`.
+    """
+
+    def is_cached(self, request):
+        toolbar = getattr(request, 'toolbar', None)
+        return toolbar is None or not (
+            getattr(toolbar, 'show_toolbar', False) or
+            getattr(toolbar, 'edit_mode_active', False))
+
+    def get_cached_events(self, instance, key_parts, build, cached=True):
+        max_timeout = settings.ALDRYN_EVENTS_PLUGIN_CACHE_TIMEOUT
+        if not max_timeout or not cached:
+            return build()
+        namespace = self.get_namespace(instance)
+        key_parts = (instance.pk, instance.changed_date.isoformat(),
+                     namespace) + tuple(key_parts)
+        return get_or_build(
+            'plugin', key_parts, build,
+            timeout=lambda: get_events_cache_timeout(namespace, max_timeout))
+
+
+class DeferredMixin(object):
+    """
+    Plugins with `deferred` set render a placeholder instead of their
+    content, which loads the content from the events_plugin url of their
+    namespace (see `views.EventPluginView`). The page does not change with
+    the events then and can be cached for longer. Editors see the content
+    right away.
+    """
+    deferred_template = 'aldryn_events/plugins/deferred.html'
+
+    def get_deferred_url(self, context, instance):
+        """
+        Returns the url the content of instance is loaded from, or None if
+        it is rendered right away.
+        """
+        if not instance.deferred or context.get('deferred_content'):
+            return None
+        if not self.is_cached(context['request']):
+            return None
+        try:
+            return reverse(
+                '{0}:events_plugin'.format(self.get_namespace(instance)),
+                kwargs={'pk': instance.pk})
+        except NoReverseMatch:
+            return None
+
+    def defer(self, context, instance):
+        """
+        Adds the url of the content of instance to the context and returns
+        True if its rendering is deferred.
+        """
+        context['deferred_url'] = self.get_deferred_url(context, instance)
+        if context['deferred_url'] is None:
+            return False
+        context['instance'] = instance
+        return True
+
+
 class UpcomingPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
-                     CMSPluginBase):
+                     EventsCacheMixin, DeferredMixin, CMSPluginBase):
     render_template = False
     name = _('Upcoming or Past Events')
     module = _('Events')
@@ -109,23 +191,48 @@ class UpcomingPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
                                                      placeholder)
         if context.get('plugin_configuration_error') is not None:
             return context
+        if self.defer(context, instance):
+            return context
 
         context['instance'] = instance
-        language = self.get_language(context['request'])
+        request = context['request']
+        language = self.get_language(request)
         namespace = self.get_namespace(instance)
         if instance.language not in self.valid_languages:
             events = Event.objects.none()
         else:
-            events = Event.objects.namespace(namespace).language(language)
-            events = events.translated(*self.valid_languages)
-            if instance.past_events:
-                events = events.past(count=instance.latest_entries)
-            else:
-                events = events.upcoming(count=instance.latest_entries)
+            events = self.get_events(
+                instance, namespace, language, self.valid_languages,
+                get_loader(request), self.is_cached(request))
         context['events'] = events
         return context
 
+    def get_events(self, instance, namespace, language, valid_languages,
+                   loader, cached=True):
+        if use_listings():
+            events = EventListing.objects.namespace(namespace).filter(
+                language=language)
+        else:
+            events = Event.objects.namespace(namespace).language(language)
+            events = events.translated(*valid_languages).for_listing(
+                projection='teaser')
+        # upcoming plugins of the same page share their query
+        key_parts = (namespace, language, use_listings())
+        return self.get_cached_events(
+            instance, key_parts,
+            lambda: loader.get_upcoming(
+                events, key_parts, instance.latest_entries,
+                instance.past_events),
+            cached)
+
+    def prerender(self, instance, namespace, language, valid_languages,
+                  loader):
+        self.get_events(
+            instance, namespace, language, valid_languages, loader)
+
     def get_render_template(self, context, instance, placeholder):
+        if context.get('deferred_url'):
+            return self.deferred_template
         name = '%s/upcoming.html' % instance.style
         return 'aldryn_events/plugins/upcoming/%s' % name
 
@@ -147,18 +254,30 @@ class EventListCMSPlugin(NameSpaceCheckMixin, CMSPluginBase):
         context['instance'] = instance
         if instance.language not in self.valid_languages:
             events = Event.objects.none()
+        elif use_listings():
+            events = self.get_listings(instance, namespace, language)
         else:
             events = instance.events.namespace(namespace).language(language)
-            events = events.translated(*self.valid_languages)
+            events = events.translated(*self.valid_languages).for_listing(
+                projection='teaser')
         context['events'] = events
         return context
 
+    def get_listings(self, instance, namespace, language):
+        # same order as the events of the plugin
+        pks = list(apply_namespace_ordering(
+            instance.events.values_list('pk', flat=True), namespace))
+        listings = EventListing.objects.filter(
+            event__in=pks, namespace=namespace, language=language)
+        listings = dict((listing.event_id, listing) for listing in listings)
+        return [listings[pk] for pk in pks if pk in listings]
+
     def get_render_template(self, context, instance, placeholder):
         return 'aldryn_events/plugins/list/%s/list.html' % instance.style
 
 
 class CalendarPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
-                     CMSPluginBase):
+                     EventsCacheMixin, DeferredMixin, CMSPluginBase):
     render_template = 'aldryn_events/plugins/calendar.html'
     name = _('Calendar')
     module = _('Events')
@@ -170,9 +289,12 @@ class CalendarPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
                                                      placeholder)
         if context.get('plugin_configuration_error') is not None:
             return context
+        if self.defer(context, instance):
+            return context
         namespace = self.get_namespace(instance)
-        language = self.get_language(context['request'])
-        site_id = getattr(get_current_site(context['request']), 'id', None)
+        loader = get_loader(context['request'])
+        language = loader.get_language()
+        site_id = loader.get_site_id()
         year = context.get('event_year')
         month = context.get('event_month')
 
@@ -181,11 +303,14 @@ class CalendarPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
             month = str(timezone.now().date().month)
 
         current_date = datetime.date(int(year), int(month), 1)
+        self.get_month_events(
+            instance, namespace, language, site_id, int(year), int(month),
+            loader, self.is_cached(context['request']))
 
         context['event_year'] = year
         context['event_month'] = month
         context['days'] = build_calendar(
-            year, month, language, namespace, site_id)
+            year, month, language, namespace, site_id, loader)
         context['current_date'] = current_date
         context['last_month'] = current_date + datetime.timedelta(days=-1)
         context['next_month'] = current_date + datetime.timedelta(days=35)
@@ -193,6 +318,32 @@ class CalendarPlugin(NameSpaceCheckMixin, AdjustableCacheMixin,
         context['calendar_namespace'] = namespace
         return context
 
+    def get_render_template(self, context, instance, placeholder):
+        if context.get('deferred_url'):
+            return self.deferred_template
+        return self.render_template
+
+    def get_month_events(self, instance, namespace, language, site_id, year,
+                         month, loader, cached=True):
+        # the calendar tag of the template gets the cached events through
+        # the loader too
+        monthdates = get_calendar_dates(year, month)
+        key_parts = (monthdates[0], monthdates[-1], language, namespace,
+                     site_id)
+        events = self.get_cached_events(
+            instance, ('calendar', use_listings()) + key_parts,
+            lambda: loader.get_calendar_events(*key_parts), cached)
+        loader.prime('calendar_events', key_parts, events)
+        return events
+
+    def prerender(self, instance, namespace, language, valid_languages,
+                  loader):
+        # the month shown without a month in the context
+        today = timezone.now().date()
+        self.get_month_events(
+            instance, namespace, language, Site.objects.get_current().pk,
+            today.year, today.month, loader)
+
 
 plugin_pool.register_plugin(CalendarPlugin)
 plugin_pool.register_plugin(EventListCMSPlugin)
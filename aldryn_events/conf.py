@@ -14,7 +14,54 @@ class EventsAppConf(AppConf):
     MANAGER_REGISTRATION_EMAIL = False
     MANAGERS = None
     DEFAULT_FROM_EMAIL = None
+    # upper bound for the cached events of the upcoming and calendar plugins,
+    # which are invalidated by event changes, 0 disables the cache
     PLUGIN_CACHE_TIMEOUT = 900
+    # build the cached events of those plugins when an event changes instead
+    # of on the next request, see aldryn_events.prerender
+    PLUGIN_PRERENDER = False
+    # upper bound for the cached year/month navigation, 0 disables the cache
+    NAVIGATION_CACHE_TIMEOUT = 60 * 60 * 24
+    # caches the previous/next events of event detail pages, 0 disables it
+    NEIGHBORS_CACHE_TIMEOUT = 0
+    # process-local interval index of event dates, see aldryn_events.index
+    INTERVAL_INDEX = False
+    # maximum amount of events kept in the interval indexes of a process
+    INTERVAL_INDEX_MAX_EVENTS = 100000
+    # on PostgreSQL, filter events by dates with a daterange overlap (&&)
+    # served by a GiST index instead of the portable Q filters
+    POSTGRES_DATERANGE = True
+    # paginate the list views with opaque next/previous cursors instead of
+    # page numbers, every page costs the same amount of queries
+    CURSOR_PAGINATION = False
+    # at most this many ongoing events are listed first if the events config
+    # shows ongoing events first, None lists all of them first
+    ONGOING_FIRST_LIMIT = None
+    # limit the events menu to the next upcoming events, at most that many of
+    # them / starting within that many days, None for no limit. The event of
+    # the detail view is added for breadcrumbs.
+    MENU_UPCOMING_COUNT = None
+    MENU_UPCOMING_DAYS = None
+    # upper bound for the cached nodes of the events menu, 0 disables it
+    MENU_CACHE_TIMEOUT = 60 * 60 * 24
+    # maintain the EventListing read model and read the calendar, plugins and
+    # menu from it, see aldryn_events.listings
+    LISTINGS = False
+    # event columns loaded by EventQuerySet.for_listing(projection=name),
+    # extend them if overridden templates need more fields. Translations are
+    # always loaded completely, parler reads all their fields on load.
+    PROJECTIONS = {
+        # EventsMenu
+        'menu': ('app_config',),
+        # upcoming and list plugins
+        'teaser': (
+            'app_config', 'start_date', 'start_time', 'end_date', 'end_time',
+        ),
+        # list views
+        'list': (
+            'app_config', 'start_date', 'start_time', 'end_date', 'end_time',
+        ),
+    }
 
     def configure_managers(self, value):
         if value is None:
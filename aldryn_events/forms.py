@@ -204,7 +204,7 @@ class UpcomingPluginForm(AppConfigPluginFormMixin, forms.ModelForm):
     class Meta:
         model = UpcomingPluginItem
         fields = ['app_config', 'past_events', 'latest_entries', 'style',
-                  'cache_duration']
+                  'cache_duration', 'deferred']
 
     def clean_style(self):
         style = self.cleaned_data.get('style')
@@ -244,8 +244,8 @@ class EventOptionForm(AppDataForm):
         help_text=_(
             "When flagged will add an ongoing_objects to the context and "
             "exclude these objects from the normal list. If you are using "
-            "the default template it's rendered as 'Current events'. Note: "
-            "ongoing objects are not paginated."
+            "the default template it's rendered as 'Current events'. "
+            "Ongoing objects are paginated along with the normal list."
         )
     )
 
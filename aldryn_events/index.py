@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Optional process-local index of the date intervals of published events,
+enabled with ALDRYN_EVENTS_INTERVAL_INDEX = True.
+
+It answers "which events overlap [first_date, last_date]" without asking the
+database. Indexes are loaded lazily per namespace, kept up to date from the
+save/delete signals of this process and rebuilt when another process changed
+events (detected through the events generation).
+"""
+from __future__ import unicode_literals
+
+import calendar
+import threading
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.utils import timezone
+
+from .cache import get_generation
+from .conf import settings
+
+# events are kept in tiers by the amount of days they span, so that a few
+# long events do not widen the lookups of all others
+SPAN_TIERS = (7, 31, 366)
+
+
+def to_timestamp(value):
+    if timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.utc)
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+class IntervalTier(object):
+    """
+    Parallel arrays of the events spanning at most max_span days, ordered by
+    (start, pk).
+    """
+
+    def __init__(self, max_span=None):
+        self.max_span = max_span
+        self.starts = array('l')
+        self.ends = array('l')
+        self.pks = array('l')
+        self.publish_at = array('d')
+        self.languages = []
+
+    def __len__(self):
+        return len(self.pks)
+
+    def append(self, start, end, pk, publish_at, languages):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.pks.append(pk)
+        self.publish_at.append(publish_at)
+        self.languages.append(languages)
+
+    def insert(self, start, end, pk, publish_at, languages):
+        position = bisect_right(self.starts, start)
+        # keep (start, pk) ordering for events starting the same day
+        while (position > 0 and self.starts[position - 1] == start and
+               self.pks[position - 1] > pk):
+            position -= 1
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.pks.insert(position, pk)
+        self.publish_at.insert(position, publish_at)
+        self.languages.insert(position, languages)
+
+    def find(self, start, pk):
+        position = bisect_left(self.starts, start)
+        while self.pks[position] != pk:
+            position += 1
+        return position
+
+    def remove(self, start, pk):
+        position = self.find(start, pk)
+        del self.starts[position]
+        del self.ends[position]
+        del self.pks[position]
+        del self.publish_at[position]
+        del self.languages[position]
+
+    def overlapping(self, first, last, now, languages):
+        if self.max_span is None:
+            low = 0
+        else:
+            low = bisect_left(self.starts, first - self.max_span)
+        high = bisect_right(self.starts, last)
+        ends, publish_at = self.ends, self.publish_at
+        found = []
+        for position in range(low, high):
+            if (ends[position] >= first and publish_at[position] <= now and
+                    (languages is None or
+                     self.languages[position] & languages)):
+                found.append((self.starts[position], self.pks[position]))
+        return found
+
+
+class IntervalIndex(object):
+    """
+    Sorted arrays of (start, effective end, pk) of the published events of a
+    namespace, with their publish_at and translation languages. Dates are
+    stored as ordinals, effective end is end_date or start_date.
+    """
+
+    def __init__(self, entries=()):
+        self.tiers = [IntervalTier(max_span) for max_span in SPAN_TIERS]
+        self.tiers.append(IntervalTier())
+        # pk -> start of the event
+        self.starts = {}
+        # shared language sets, to not keep a set per event
+        self.language_sets = {}
+        for start, end, pk, publish_at, languages in sorted(
+                entries, key=lambda entry: (entry[0], entry[2])):
+            self.starts[pk] = start
+            self.get_tier(end - start).append(
+                start, end, pk, publish_at, self.get_languages(languages))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __contains__(self, pk):
+        return pk in self.starts
+
+    def get_tier(self, span):
+        for tier in self.tiers:
+            if tier.max_span is None or span <= tier.max_span:
+                return tier
+
+    def get_languages(self, languages):
+        languages = frozenset(languages)
+        return self.language_sets.setdefault(languages, languages)
+
+    def get_position(self, pk):
+        start = self.starts[pk]
+        for tier in self.tiers:
+            position = bisect_left(tier.starts, start)
+            while (position < len(tier) and
+                   tier.starts[position] == start):
+                if tier.pks[position] == pk:
+                    return tier, position
+                position += 1
+
+    def add(self, start, end, pk, publish_at, languages):
+        if pk in self.starts:
+            self.remove(pk)
+        self.starts[pk] = start
+        self.get_tier(end - start).insert(
+            start, end, pk, publish_at, self.get_languages(languages))
+
+    def remove(self, pk):
+        if pk in self.starts:
+            tier, position = self.get_position(pk)
+            tier.remove(self.starts.pop(pk), pk)
+
+    def add_language(self, pk, language):
+        if pk in self.starts:
+            tier, position = self.get_position(pk)
+            tier.languages[position] = self.get_languages(
+                tier.languages[position] | set([language]))
+
+    def remove_language(self, pk, language):
+        if pk in self.starts:
+            tier, position = self.get_position(pk)
+            tier.languages[position] = self.get_languages(
+                tier.languages[position] - set([language]))
+
+    def overlapping(self, first_date, last_date, languages=None, now=None):
+        """
+        Returns the pks of the events published at now (defaults to the
+        current time) which overlap first_date..last_date (both included),
+        ordered by start date. If languages are given, only events with a
+        translation in one of them are returned.
+        """
+        now = to_timestamp(now or timezone.now())
+        first, last = first_date.toordinal(), last_date.toordinal()
+        languages = frozenset(languages) if languages else None
+        found = []
+        for tier in self.tiers:
+            found.extend(tier.overlapping(first, last, now, languages))
+        return [pk for start, pk in sorted(found)]
+
+
+def is_enabled():
+    return settings.ALDRYN_EVENTS_INTERVAL_INDEX
+
+
+def load_index(namespace, budget):
+    """
+    Builds the index of namespace from the database. Returns None if it has
+    more than budget events.
+    """
+    from .models import Event
+
+    events = Event.objects.namespace(namespace).filter(is_published=True)
+    if events.count() > budget:
+        return None
+
+    languages = {}
+    translations = Event._parler_meta.root_model.objects.filter(
+        master__in=events).values_list('master_id', 'language_code')
+    for pk, language in translations:
+        languages.setdefault(pk, set()).add(language)
+
+    rows = events.values_list(
+        'pk', 'start_date', 'effective_end_date', 'publish_at')
+    entries = []
+    for pk, start_date, end_date, publish_at in rows:
+        entries.append((start_date.toordinal(), end_date.toordinal(), pk,
+                        to_timestamp(publish_at), languages.get(pk, ())))
+    return IntervalIndex(entries)
+
+
+class IndexRegistry(object):
+    """
+    The loaded indexes of this process, valid for one events generation.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = None
+        self.indexes = {}
+
+    def clear(self):
+        with self.lock:
+            self.generation = None
+            self.indexes.clear()
+
+    def get(self, namespace):
+        generation = get_generation()
+        with self.lock:
+            if self.generation != generation:
+                # events were changed by another process, start over
+                self.indexes.clear()
+                self.generation = generation
+            if namespace not in self.indexes:
+                budget = settings.ALDRYN_EVENTS_INTERVAL_INDEX_MAX_EVENTS
+                budget -= sum(len(index) for index in self.indexes.values()
+                              if index is not None)
+                self.indexes[namespace] = load_index(namespace, budget)
+            return self.indexes[namespace]
+
+    def update(self, update, old_generation, new_generation):
+        """
+        Applies update (a callable taking namespace and index) to all loaded
+        indexes, if they were up to date before the change which led to
+        new_generation. Otherwise they are dropped and lazily loaded again.
+        """
+        with self.lock:
+            if (self.generation is None or
+                    self.generation != old_generation or
+                    new_generation != old_generation + 1):
+                self.clear()
+                return
+            for namespace, index in self.indexes.items():
+                if index is not None:
+                    update(namespace, index)
+            self.generation = new_generation
+
+
+registry = IndexRegistry()
+
+
+def get_index(namespace):
+    """
+    Returns the interval index of namespace, or None if the index is disabled
+    or the namespace does not fit into the memory budget.
+    """
+    if not is_enabled():
+        return None
+    return registry.get(namespace)
+
+
+def get_change(instance, deleted):
+    """
+    Returns the update of the loaded indexes (see `IndexRegistry.update`)
+    after instance (an event, an event translation or an events config) was
+    saved or deleted, or None if they have to be dropped. It is taken when
+    the change happens and applied with `apply_change` once it is committed.
+    """
+    from .models import Event, EventsConfig
+
+    if isinstance(instance, EventsConfig):
+        # namespaces might have changed
+        return None
+
+    if isinstance(instance, Event):
+        namespace = entry = None
+        if not deleted and instance.is_published:
+            namespace = instance.app_config.namespace
+            entry = get_event_entry(
+                instance, instance.get_available_languages())
+
+        def update(index_namespace, index):
+            index.remove(instance.pk)
+            if entry and index_namespace == namespace:
+                index.add(*entry)
+    else:
+        # a translation
+        master_id = instance.master_id
+        language_code = instance.language_code
+
+        def update(index_namespace, index):
+            if deleted:
+                index.remove_language(master_id, language_code)
+            else:
+                index.add_language(master_id, language_code)
+    return update
+
+
+def apply_change(change, old_generation, new_generation):
+    """
+    Applies change (see `get_change`) to the loaded indexes.
+    """
+    if change is None:
+        registry.clear()
+    else:
+        registry.update(change, old_generation, new_generation)
+
+
+def get_event_entry(event, languages):
+    # the attributes are what was assigned, e.g. strings passed to create()
+    opts = event._meta
+    start_date = opts.get_field('start_date').to_python(event.start_date)
+    end_date = event.get_effective_end_date()
+    publish_at = opts.get_field('publish_at').to_python(event.publish_at)
+    if settings.USE_TZ and timezone.is_naive(publish_at):
+        # saved in the default time zone as well
+        publish_at = timezone.make_aware(
+            publish_at, timezone.get_default_timezone())
+    return (start_date.toordinal(), end_date.toordinal(), event.pk,
+            to_timestamp(publish_at), languages)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Optional read model of events, enabled with ALDRYN_EVENTS_LISTINGS = True.
+
+`models.EventListing` holds one row per event and language of the site, with
+what lists render resolved up front: the title and slug with respect to the
+language fallbacks, the url and the dates. The calendar, the plugins and the
+menu read those rows with a single query instead of joining translations.
+
+Rows are kept up to date from the save/delete signals of events, their
+translations and events configs. Urls depend on the apphooks, after those
+changed the listings are not read until they are rebuilt, e.g. with the
+rebuild_event_listings management command.
+"""
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.core.urlresolvers import NoReverseMatch
+from django.db import transaction
+
+from cms.utils.i18n import get_language_list
+from parler.utils.context import switch_language
+
+from .conf import settings
+from .utils import get_valid_languages
+
+STALE_CACHE_KEY = 'aldryn_events:listings_stale'
+
+# pks of the events being deleted, their translations are deleted first and
+# must not bring their listings back
+_deleting = set()
+
+
+def is_enabled():
+    return settings.ALDRYN_EVENTS_LISTINGS
+
+
+def is_current():
+    """
+    Returns False if the urls of the listings might be outdated since the
+    apphooks changed.
+    """
+    return not cache.get(STALE_CACHE_KEY)
+
+
+def use_listings():
+    """
+    Returns True if events should be read from the listings.
+    """
+    return is_enabled() and is_current()
+
+
+def mark_stale():
+    cache.set(STALE_CACHE_KEY, True, None)
+
+
+def build_listings(event, languages, site_id=None):
+    """
+    Returns the (unsaved) listings of event for every language of languages
+    in which it can be shown, that is if it has a translation in one of the
+    valid languages (see `utils.get_valid_languages`) of that language.
+    """
+    from .models import EventListing
+
+    namespace = event.app_config.namespace
+    available = set(
+        translation.language_code
+        for translation in event.translations.all())
+    listings = []
+    for language in languages:
+        if not available.intersection(
+                get_valid_languages(namespace, language, site_id)):
+            continue
+        slug, slug_language = event.known_translation_getter(
+            'slug', default='', language_code=language)
+        with switch_language(event, language):
+            title = event.get_title()
+        try:
+            url = event.get_absolute_url(language)
+        except NoReverseMatch:
+            url = ''
+        listings.append(EventListing(
+            event=event,
+            language=language,
+            namespace=namespace,
+            translation_language=slug_language or language,
+            title=title or '',
+            slug=slug or '',
+            url=url,
+            start_date=event.start_date,
+            start_time=event.start_time,
+            end_date=event.end_date,
+            end_time=event.end_time,
+            effective_end_date=event.get_effective_end_date(),
+            is_published=event.is_published,
+            publish_at=event.publish_at,
+        ))
+    return listings
+
+
+def get_events():
+    from .models import Event
+
+    return (Event.objects.select_related('app_config')
+                         .prefetch_related('translations'))
+
+
+def update_listings(events):
+    """
+    Replaces the listings of events (a queryset) with freshly built ones.
+    """
+    from .models import EventListing
+
+    languages = get_language_list()
+    with transaction.atomic(using=events.db):
+        EventListing.objects.filter(event__in=events).delete()
+        listings = []
+        for event in events:
+            listings.extend(build_listings(event, languages))
+        EventListing.objects.bulk_create(listings)
+
+
+def rebuild_listings(batch_size=500):
+    """
+    Rebuilds the listings of all events and marks them as current. Returns
+    the amount of listings.
+    """
+    from .models import EventListing
+
+    languages = get_language_list()
+    count = 0
+    with transaction.atomic():
+        EventListing.objects.all().delete()
+        events = get_events().order_by('pk')
+        last_pk = None
+        while True:
+            batch = events
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            listings = []
+            for event in batch:
+                listings.extend(build_listings(event, languages))
+            EventListing.objects.bulk_create(listings)
+            count += len(listings)
+            last_pk = batch[-1].pk
+    cache.delete(STALE_CACHE_KEY)
+    return count
+
+
+def apply_change(instance, deleted):
+    """
+    Updates the listings after instance (an event, an event translation or
+    an events config) was saved or deleted.
+    """
+    from .models import Event, EventsConfig
+
+    if isinstance(instance, EventsConfig):
+        if not deleted:
+            # the namespace might have changed
+            update_listings(get_events().filter(app_config=instance))
+    elif isinstance(instance, Event):
+        # deleted listings go with their event
+        if not deleted:
+            update_listings(get_events().filter(pk=instance.pk))
+    elif instance.master_id not in _deleting:
+        # a translation
+        update_listings(get_events().filter(pk=instance.master_id))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Request-scoped loader of events data. The plugins, views and template tags
+rendering the same page resolve the same languages, configs and events;
+`get_loader(request)` returns the loader of the request, which memoizes
+those lookups for the rest of the request.
+"""
+from __future__ import unicode_literals
+
+from django.contrib.sites.shortcuts import get_current_site
+from django.utils.translation import get_language_from_request
+
+from .cache import get_config, record_cache_access
+
+REQUEST_ATTRIBUTE = '_aldryn_events_loader'
+
+
+class EventLoader(object):
+    """
+    Memoizes lookups for the duration of a request. stats counts per kind of
+    lookup the hits (lookups answered without building them again, e.g.
+    coalesced queries) and the misses.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.memo = {}
+        self.stats = {}
+
+    def load(self, name, key_parts, build):
+        key = (name,) + tuple(key_parts)
+        hit = key in self.memo
+        if not hit:
+            self.memo[key] = build()
+        self.record(name, hit)
+        return self.memo[key]
+
+    def prime(self, name, key_parts, value):
+        """
+        Stores value as the result of a lookup, e.g. when it was cached.
+        """
+        self.memo[(name,) + tuple(key_parts)] = value
+
+    def record(self, name, hit):
+        counters = self.stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counters['hits' if hit else 'misses'] += 1
+        # process wide totals, see cache.get_cache_stats
+        record_cache_access('loader:{0}'.format(name), hit)
+
+    @property
+    def coalesced(self):
+        """
+        The amount of lookups which were answered from the memo.
+        """
+        return sum(counters['hits'] for counters in self.stats.values())
+
+    def get_language(self):
+        return self.load('language', (), lambda: get_language_from_request(
+            self.request, check_path=True))
+
+    def get_site_id(self):
+        if self.request is None:
+            return None
+        return self.load('site', (), lambda: getattr(
+            get_current_site(self.request), 'id', None))
+
+    def get_config(self, namespace):
+        return self.load(
+            'config', (namespace,), lambda: get_config(namespace))
+
+    def get_valid_languages(self, namespace, language, site_id=None):
+        from .utils import get_valid_languages
+
+        return self.load(
+            'valid_languages', (namespace, language, site_id),
+            lambda: get_valid_languages(namespace, language, site_id))
+
+    def get_calendar_events(self, first_date, last_date, language,
+                            namespace=None, site_id=None):
+        """
+        Same as `utils.get_calendar_events`, shared e.g. by the calendar
+        plugin and the calendar tag of its template.
+        """
+        from .utils import get_calendar_events
+
+        return self.load(
+            'calendar_events',
+            (first_date, last_date, language, namespace, site_id),
+            lambda: get_calendar_events(
+                first_date, last_date, language, namespace, site_id))
+
+    def get_upcoming(self, events, key_parts, count, past=False):
+        """
+        Returns a list of the first count events of events.upcoming() (or
+        events.past() if past is True). Lists of the same key_parts share a
+        single query, fewer events are sliced from a longer list.
+        """
+        name = 'past' if past else 'upcoming'
+        key = (name,) + tuple(key_parts)
+        fetched = self.memo.get(key)
+        if fetched is not None and fetched[0] >= count:
+            self.record(name, hit=True)
+            return fetched[1][:count]
+        self.record(name, hit=False)
+        if past:
+            objects = list(events.past(count=count))
+        else:
+            objects = list(events.upcoming(count=count))
+        self.memo[key] = (count, objects)
+        return objects
+
+
+def get_loader(request):
+    """
+    Returns the loader of request, a new (not shared) one if request is None.
+    """
+    if request is None:
+        return EventLoader()
+    loader = getattr(request, REQUEST_ATTRIBUTE, None)
+    if loader is None:
+        loader = EventLoader(request)
+        setattr(request, REQUEST_ATTRIBUTE, loader)
+    return loader
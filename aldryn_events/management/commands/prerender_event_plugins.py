@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from aldryn_events.models import EventsConfig
+from aldryn_events.prerender import prerender_plugins
+
+
+class Command(BaseCommand):
+    help = ('Pre-renders the upcoming and calendar plugins '
+            '(see aldryn_events.prerender).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--namespace', action='append', dest='namespaces',
+            help='Only pre-render the plugins of this namespace.')
+
+    def handle(self, *args, **options):
+        app_configs = None
+        if options['namespaces']:
+            app_configs = list(EventsConfig.objects.filter(
+                namespace__in=options['namespaces']))
+        count = prerender_plugins(app_configs)
+        self.stdout.write('Pre-rendered {0} plugins.'.format(count))
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from aldryn_events.listings import rebuild_listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the event listings (see aldryn_events.listings).'
+
+    def handle(self, *args, **options):
+        count = rebuild_listings()
+        self.stdout.write('Rebuilt {0} event listings.'.format(count))
@@ -1,17 +1,25 @@
 # -*- coding: utf-8 -*-
-from django.db.models import Q
+from django.db.models import (
+    BooleanField, Case, Prefetch, Q, QuerySet, Value, When,
+)
 from django.utils import timezone
 
 from aldryn_apphooks_config.managers.parler import (
     AppHookConfigTranslatableManager, AppHookConfigTranslatableQueryset
 )
 
-from .cms_appconfig import EventsConfig
+from .cache import get_config
+from .conf import settings
+from .utils import get_ongoing_q_filters
 
 from . import ARCHIVE_ORDERING_FIELDS, ORDERING_FIELDS
 
 
-class EventQuerySet(AppHookConfigTranslatableQueryset):
+class EventDatesQuerySetMixin(object):
+    """
+    Publishing and date filters of events, shared by the querysets of
+    `models.Event` and of its read model `models.EventListing`.
+    """
 
     def upcoming(self, count, now=None):
         now = now or timezone.now()
@@ -26,25 +34,19 @@ class EventQuerySet(AppHookConfigTranslatableQueryset):
         includes all events that have ended
         """
         now = now or timezone.now()
-        today = now.date()
-        q_with_end_date = Q(end_date__lt=today)
-        q_without_end_date = Q(end_date__isnull=True, start_date__lt=today)
         return (self.published(now=now)
-                    .filter(q_with_end_date | q_without_end_date)
+                    .filter(effective_end_date__lt=now.date())
                     .order_by(*ARCHIVE_ORDERING_FIELDS))
 
     def future(self, now=None):
         """
         includes all events that are not over yet. If there is an end_date,
         the event is not over until end_date is over. Otherwise we use
-        start_date.
+        start_date (see `Event.effective_end_date`).
         """
         now = now or timezone.now()
-        today = now.date()
-        q_with_end_date = Q(end_date__gte=today)
-        q_without_end_date = Q(end_date__isnull=True, start_date__gte=today)
         return (self.published(now=now)
-                    .filter(q_with_end_date | q_without_end_date)
+                    .filter(effective_end_date__gte=now.date())
                     .order_by(*ORDERING_FIELDS))
 
     def published(self, now=None):
@@ -54,10 +56,65 @@ class EventQuerySet(AppHookConfigTranslatableQueryset):
     def ongoing(self, now=None):
         now = now or timezone.now()
         _date = now.date()
-        return self.published(now).filter(
-            Q(start_date__lte=_date),
-            Q(end_date__isnull=True) | Q(end_date__gte=_date)
-        )
+        # NOTE: unlike future() and archive(), events without an end_date
+        # are considered ongoing once they started, so effective_end_date
+        # can not be used here.
+        return self.published(now).filter(get_ongoing_q_filters(_date))
+
+
+class EventQuerySet(EventDatesQuerySetMixin,
+                    AppHookConfigTranslatableQueryset):
+
+    def ongoing_first(self, now=None, limit=None):
+        """
+        Annotates is_ongoing (see ongoing(), publishing is not checked) and
+        orders the ongoing events before the others, keeping the ordering of
+        the queryset otherwise. If limit is given, at most limit ongoing
+        events are flagged, the others keep their place in the ordering;
+        their pks are fetched right away.
+        """
+        now = now or timezone.now()
+        condition = get_ongoing_q_filters(now.date())
+        ordering = self.query.order_by or self.model._meta.ordering
+        if limit is not None:
+            # the first ongoing events, selected without the joins (and the
+            # DISTINCT) of this queryset
+            ongoing = (self.model._default_manager.using(self.db)
+                           .filter(pk__in=self.filter(condition).values('pk'))
+                           .order_by(*ordering))
+            if not self.query.standard_ordering:
+                ongoing = ongoing.reverse()
+            # fetched first, MySQL does not support LIMIT in subqueries of IN
+            condition = Q(pk__in=list(
+                ongoing.values_list('pk', flat=True)[:limit]))
+        qs = self.annotate(is_ongoing=Case(
+            When(condition, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ))
+        # reverse() flips the whole ordering, ongoing events stay first
+        flag = '-is_ongoing' if qs.query.standard_ordering else 'is_ongoing'
+        return qs.order_by(flag, *ordering)
+
+    def for_listing(self, projection=None):
+        """
+        Fetches what rendering events in lists needs, with a fixed amount of
+        queries: the app config and the translations (with their images).
+        If projection is given, only the event columns of
+        ALDRYN_EVENTS_PROJECTIONS[projection] are loaded.
+
+        All translations are prefetched: parler takes the prefetched
+        translations for the complete set, picking the fallback languages
+        and answering get_available_languages() and has_translation() from
+        them.
+        """
+        translations = (self.model._parler_meta.root_model.objects
+                            .select_related('image'))
+        qs = self.select_related('app_config').prefetch_related(
+            Prefetch('translations', queryset=translations))
+        if projection is not None:
+            qs = qs.only(*settings.ALDRYN_EVENTS_PROJECTIONS[projection])
+        return qs
 
     def namespace(self, namespace, to=None):
         """
@@ -65,10 +122,21 @@ class EventQuerySet(AppHookConfigTranslatableQueryset):
         flag on the namespace to set the ordering accordingly.
         """
         qs = super(EventQuerySet, self).namespace(namespace, to)
-        app = EventsConfig.objects.filter(namespace=namespace).first()
-        if app and app.latest_first:
-            qs = qs.reverse()
-        return qs
+        return apply_namespace_ordering(qs, namespace)
+
+
+class EventListingQuerySet(EventDatesQuerySetMixin, QuerySet):
+
+    def namespace(self, namespace):
+        qs = self.filter(namespace=namespace)
+        return apply_namespace_ordering(qs, namespace)
+
+
+def apply_namespace_ordering(qs, namespace):
+    app = get_config(namespace)
+    if app and app.latest_first:
+        qs = qs.reverse()
+    return qs
 
 
 class EventManager(AppHookConfigTranslatableManager):
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:37
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_events', '0026_auto_20180112_1738'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('app_config', 'is_published', 'publish_at'), ('app_config', 'end_date', 'start_date'), ('app_config', 'start_date', 'start_time', 'end_date', 'end_time')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    Event = apps.get_model('aldryn_events', 'Event')
+    Event.objects.filter(end_date__isnull=True).update(
+        effective_end_date=models.F('start_date'))
+    Event.objects.filter(end_date__isnull=False).update(
+        effective_end_date=models.F('end_date'))
+    # end dates before the start are only rejected by Event.clean()
+    Event.objects.filter(effective_end_date__lt=models.F('start_date')).update(
+        effective_end_date=models.F('start_date'))
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_events', '0027_auto_20261018_2037'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='effective_end_date',
+            field=models.DateField(editable=False, null=True, verbose_name='effective end date'),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.AlterField(
+            model_name='event',
+            name='effective_end_date',
+            field=models.DateField(editable=False, verbose_name='effective end date'),
+        ),
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('app_config', 'is_published', 'publish_at'), ('app_config', 'effective_end_date', 'start_date'), ('app_config', 'start_date', 'start_time', 'end_date', 'end_time')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+INDEX_NAME = 'aldryn_events_event_daterange_gist'
+
+
+def forwards(apps, schema_editor):
+    # the GiST index is only used by the PostgreSQL specific date filters
+    # (see utils.filter_events_by_daterange)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX {0} ON aldryn_events_event USING gist '
+        "(daterange(start_date, effective_end_date, '[]'))".format(INDEX_NAME))
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_events', '0028_event_effective_end_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
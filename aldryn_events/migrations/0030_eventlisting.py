@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_events', '0029_event_daterange_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventListing',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=15, verbose_name='language')),
+                ('namespace', models.CharField(max_length=100, verbose_name='instance namespace')),
+                ('translation_language', models.CharField(max_length=15, verbose_name='translation language')),
+                ('title', models.CharField(max_length=150, verbose_name='title')),
+                ('slug', models.SlugField(db_index=False, max_length=150, verbose_name='slug')),
+                ('url', models.CharField(blank=True, max_length=255, verbose_name='url')),
+                ('start_date', models.DateField(verbose_name='start date')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='start time')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='end date')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='end time')),
+                ('effective_end_date', models.DateField(verbose_name='effective end date')),
+                ('is_published', models.BooleanField(default=True, verbose_name='is published')),
+                ('publish_at', models.DateTimeField(verbose_name='publish at')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listings', to='aldryn_events.Event')),
+            ],
+            options={
+                'verbose_name': 'Event listing',
+                'verbose_name_plural': 'Event listings',
+                'ordering': ('start_date', 'start_time', 'end_date', 'end_time'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventlisting',
+            unique_together=set([('event', 'language')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='eventlisting',
+            index_together=set([('namespace', 'language', 'start_date', 'start_time', 'end_date', 'end_time'), ('namespace', 'language', 'effective_end_date', 'start_date')]),
+        ),
+    ]
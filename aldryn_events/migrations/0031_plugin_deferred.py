@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_events', '0030_eventlisting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventcalendarplugin',
+            name='deferred',
+            field=models.BooleanField(default=False, help_text='Loads the events with a separate request, so that the page can be cached independently of them.', verbose_name='deferred'),
+        ),
+        migrations.AddField(
+            model_name='upcomingpluginitem',
+            name='deferred',
+            field=models.BooleanField(default=False, help_text='Loads the events with a separate request, so that the page can be cached independently of them.', verbose_name='deferred'),
+        ),
+    ]
@@ -2,14 +2,17 @@
 from __future__ import unicode_literals
 
 from django.core.exceptions import ValidationError
-from django.core.urlresolvers import reverse
+from django.core.signals import setting_changed
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.encoding import force_text, python_2_unicode_compatible
-from django.utils.translation import override, ugettext_lazy as _, ugettext
+from django.utils.translation import ugettext_lazy as _, ugettext
 
 from cms.models import CMSPlugin
 from cms.models.fields import PlaceholderField
+from cms.signals import urls_need_reloading
 from cms.utils.i18n import get_current_language, get_redirect_on_fallback
 
 from aldryn_translation_tools.models import (
@@ -21,10 +24,17 @@ from filer.fields.image import FilerImageField
 from parler.models import TranslatableModel, TranslatedFields
 from sortedm2m.fields import SortedManyToManyField
 
+from . import index as interval_index, listings, prerender
+from .cache import (
+    bump_config_version, bump_generation, get_generation, on_commit,
+)
 from .cms_appconfig import EventsConfig
 from .conf import settings
-from .managers import EventManager
-from .utils import get_additional_styles, date_or_datetime
+from .managers import EventListingQuerySet, EventManager
+from .utils import (
+    clear_event_url_cache, clear_valid_languages_cache, get_additional_styles,
+    date_or_datetime, get_event_url,
+)
 
 STANDARD = 'standard'
 
@@ -40,6 +50,10 @@ class Event(TranslatedAutoSlugifyMixin,
     start_time = models.TimeField(_('start time'), null=True, blank=True)
     end_date = models.DateField(_('end date'), null=True, blank=True)
     end_time = models.TimeField(_('end time'), null=True, blank=True)
+    # end_date or start_date, maintained in save() so that the date filters
+    # of `managers.EventQuerySet` are plain range predicates
+    effective_end_date = models.DateField(
+        _('effective end date'), editable=False)
     # TODO: add timezone (optional and purely for display purposes)
 
     is_published = models.BooleanField(
@@ -109,6 +123,16 @@ class Event(TranslatedAutoSlugifyMixin,
         #     `managers.EventsQuerySet.namespace()`
         # which reverses this ordering when the option is set.
         ordering = ('start_date', 'start_time', 'end_date', 'end_time')
+        # Composite indexes for the queries of `managers.EventQuerySet`: the
+        # first one serves the (reversible) default ordering within a
+        # namespace, the second one the archive / future date predicates and
+        # the third one the publishing filters.
+        index_together = (
+            ('app_config', 'start_date', 'start_time', 'end_date',
+             'end_time'),
+            ('app_config', 'effective_end_date', 'start_date'),
+            ('app_config', 'is_published', 'publish_at'),
+        )
 
     def get_title(self):
         return self.safe_translation_getter('title', any_language=True)
@@ -159,6 +183,20 @@ class Event(TranslatedAutoSlugifyMixin,
         if self.enable_registration and not self.registration_deadline_at:
             raise ValidationError(_("please select a registration deadline."))
 
+    def save(self, *args, **kwargs):
+        self.effective_end_date = self.get_effective_end_date()
+        super(Event, self).save(*args, **kwargs)
+
+    def get_effective_end_date(self):
+        field = self._meta.get_field('effective_end_date')
+        start_date = field.to_python(self.start_date)
+        end_date = field.to_python(self.end_date or self.start_date)
+        if start_date is not None and end_date < start_date:
+            # only clean() rejects end dates before the start, the daterange
+            # of the start and the effective end date must not be empty
+            return start_date
+        return end_date
+
     def start(self):
         return date_or_datetime(self.start_date, self.start_time)
 
@@ -210,23 +248,86 @@ class Event(TranslatedAutoSlugifyMixin,
         if not language:
             language = get_current_language()
 
-        kwargs = {}
         slug, slug_lang = self.known_translation_getter(
             'slug', default=None, language_code=language)
 
-        kwargs.update(slug=slug)
         if slug and slug_lang:
             site_id = getattr(settings, 'SITE_ID', None)
             if get_redirect_on_fallback(language, site_id):
                 language = slug_lang
 
-        if self.app_config_id and self.app_config.namespace:
-            namespace = '{0}:'.format(self.app_config.namespace)
+        if self.app_config_id:
+            namespace = self.app_config.namespace
         else:
             namespace = ''
 
-        with override(language):
-            return reverse('{0}events_detail'.format(namespace), kwargs=kwargs)
+        return get_event_url(namespace, language, slug)
+
+
+@python_2_unicode_compatible
+class EventListing(models.Model):
+    """
+    Read model of an event for one request language: the resolved title,
+    slug and url next to the dates and publishing fields, so that lists can
+    be rendered from a single query without joins. Maintained by
+    `aldryn_events.listings`, do not edit.
+    """
+    event = models.ForeignKey(
+        Event, related_name='listings', on_delete=models.CASCADE)
+    language = models.CharField(_('language'), max_length=15)
+    namespace = models.CharField(_('instance namespace'), max_length=100)
+    # language of the translation title and slug were taken from
+    translation_language = models.CharField(
+        _('translation language'), max_length=15)
+    title = models.CharField(_('title'), max_length=150)
+    slug = models.SlugField(_('slug'), max_length=150, db_index=False)
+    # empty if the event can not be reversed in language
+    url = models.CharField(_('url'), max_length=255, blank=True)
+
+    start_date = models.DateField(_('start date'))
+    start_time = models.TimeField(_('start time'), null=True, blank=True)
+    end_date = models.DateField(_('end date'), null=True, blank=True)
+    end_time = models.TimeField(_('end time'), null=True, blank=True)
+    effective_end_date = models.DateField(_('effective end date'))
+    is_published = models.BooleanField(_('is published'), default=True)
+    publish_at = models.DateTimeField(_('publish at'))
+
+    objects = EventListingQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Event listing')
+        verbose_name_plural = _('Event listings')
+        ordering = ('start_date', 'start_time', 'end_date', 'end_time')
+        unique_together = (('event', 'language'),)
+        # same purposes as the indexes of Event, within a request language
+        index_together = (
+            ('namespace', 'language', 'start_date', 'start_time', 'end_date',
+             'end_time'),
+            ('namespace', 'language', 'effective_end_date', 'start_date'),
+        )
+
+    def __str__(self):
+        return self.title
+
+    def get_title(self):
+        return self.title
+
+    def get_absolute_url(self, language=None):
+        return self.url
+
+    def start(self):
+        return date_or_datetime(self.start_date, self.start_time)
+
+    def end(self):
+        return date_or_datetime(self.end_date, self.end_time)
+
+    @property
+    def start_at(self):
+        return self.start()
+
+    @property
+    def end_at(self):
+        return self.end()
 
 
 @python_2_unicode_compatible
@@ -397,6 +498,13 @@ class UpcomingPluginItem(BaseEventPlugin):
             "The maximum duration (in seconds) that this plugin's content "
             "should be cached.")
     )
+    deferred = models.BooleanField(
+        verbose_name=_('deferred'),
+        default=False,
+        help_text=_(
+            'Loads the events with a separate request, so that the page '
+            'can be cached independently of them.')
+    )
 
     def __str__(self):
         return force_text(
@@ -414,6 +522,143 @@ class EventCalendarPlugin(BaseEventPlugin):
             "The maximum duration (in seconds) that this plugin's content "
             "should be cached.")
     )
+    deferred = models.BooleanField(
+        verbose_name=_('deferred'),
+        default=False,
+        help_text=_(
+            'Loads the events with a separate request, so that the page '
+            'can be cached independently of them.')
+    )
 
     def __str__(self):
         return force_text(self.pk)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid='aldryn_events_event_post_save')
+@receiver(post_delete, sender=Event,
+          dispatch_uid='aldryn_events_event_post_delete')
+@receiver(post_save, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_post_save')
+@receiver(post_delete, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_post_delete')
+@receiver(post_save, sender=EventsConfig,
+          dispatch_uid='aldryn_events_config_post_save')
+@receiver(post_delete, sender=EventsConfig,
+          dispatch_uid='aldryn_events_config_post_delete')
+def invalidate_events_cache(sender, instance, signal, using=None,
+                            **kwargs):
+    """
+    Everything cached from events (navigation, ...) is keyed by the events
+    generation, changing it invalidates all of it at once. That happens once
+    the change is committed, caches rebuilt before would be outdated under
+    the new generation.
+    """
+    change = None
+    if interval_index.is_enabled():
+        change = interval_index.get_change(instance, signal is post_delete)
+
+    def invalidate():
+        if interval_index.is_enabled():
+            old_generation = get_generation()
+            new_generation = bump_generation()
+            interval_index.apply_change(
+                change, old_generation, new_generation)
+        else:
+            bump_generation()
+
+    on_commit(invalidate, using)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid='aldryn_events_event_listings_post_save')
+@receiver(post_delete, sender=Event,
+          dispatch_uid='aldryn_events_event_listings_post_delete')
+@receiver(post_save, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_listings_post_save')
+@receiver(post_delete, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_listings_post_delete')
+@receiver(post_save, sender=EventsConfig,
+          dispatch_uid='aldryn_events_config_listings_post_save')
+def update_event_listings(sender, instance, signal, **kwargs):
+    """
+    Keeps `EventListing` up to date, if the listings are enabled.
+    """
+    if signal is post_delete and isinstance(instance, Event):
+        listings._deleting.discard(instance.pk)
+    if listings.is_enabled():
+        listings.apply_change(instance, signal is post_delete)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid='aldryn_events_event_prerender_post_save')
+@receiver(post_delete, sender=Event,
+          dispatch_uid='aldryn_events_event_prerender_post_delete')
+@receiver(post_save, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_prerender_post_save')
+@receiver(post_delete, sender=Event._parler_meta.root_model,
+          dispatch_uid='aldryn_events_event_translation_prerender_post_delete')
+def prerender_event_plugins(sender, instance, using=None, **kwargs):
+    """
+    Pre-renders the plugins of the events config of the changed event once
+    the change is committed, if enabled. Connected after
+    invalidate_events_cache, so that it runs after the generation bump.
+    """
+    if not prerender.is_enabled():
+        return
+    if isinstance(instance, Event):
+        app_config_id = instance.app_config_id
+    else:
+        # a translation, nothing to do if it goes with its event
+        app_config_id = Event.objects.filter(
+            pk=instance.master_id).values_list(
+                'app_config_id', flat=True).first()
+    if app_config_id is not None:
+        prerender.schedule(app_config_id, using)
+
+
+@receiver(pre_delete, sender=Event,
+          dispatch_uid='aldryn_events_event_listings_pre_delete')
+def prepare_event_listings_delete(sender, instance, **kwargs):
+    listings._deleting.add(instance.pk)
+
+
+@receiver(post_save, sender=EventsConfig,
+          dispatch_uid='aldryn_events_config_version_post_save')
+@receiver(post_delete, sender=EventsConfig,
+          dispatch_uid='aldryn_events_config_version_post_delete')
+@receiver(post_save, sender=EventsConfig._parler_meta.root_model,
+          dispatch_uid='aldryn_events_config_translation_post_save')
+@receiver(post_delete, sender=EventsConfig._parler_meta.root_model,
+          dispatch_uid='aldryn_events_config_translation_post_delete')
+def invalidate_config_cache(sender, **kwargs):
+    """
+    Drops the events configs cached by `cache.get_config` in all processes.
+    """
+    bump_config_version()
+
+
+@receiver(urls_need_reloading,
+          dispatch_uid='aldryn_events_urls_need_reloading')
+@receiver(setting_changed,
+          dispatch_uid='aldryn_events_setting_changed')
+def invalidate_valid_languages_cache(**kwargs):
+    """
+    Language fallbacks resolved by `utils.get_valid_languages` and the event
+    urls of `utils.get_event_url` depend on the apphooks and the language
+    settings, and so does everything cached with event urls (e.g. the nodes
+    of the events menu).
+    """
+    clear_valid_languages_cache()
+    clear_event_url_cache()
+    bump_generation()
+
+
+@receiver(urls_need_reloading,
+          dispatch_uid='aldryn_events_listings_urls_need_reloading')
+def invalidate_event_listings(**kwargs):
+    """
+    Urls of `EventListing` depend on the apphooks.
+    """
+    if listings.is_enabled():
+        listings.mark_stale()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.utils.translation import ugettext_lazy as _
+
+from .utils import get_seek_q_filters
+
+
+class ChainedQuerySets(object):
+    """
+    Read-only sequence of the rows of several querysets, one after the
+    other, which can be paginated like a single queryset. Every queryset is
+    counted once and slicing only fetches the rows of the requested range
+    from the querysets it overlaps.
+
+    parts is a list of (queryset, prepare) tuples, prepare is None or a
+    callable applied to every fetched object of its queryset.
+    """
+    # the parts are ordered querysets, tells the paginator not to warn
+    ordered = True
+
+    def __init__(self, parts):
+        self.parts = [
+            part if isinstance(part, tuple) else (part, None)
+            for part in parts
+        ]
+        self._counts = None
+
+    def get_counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset, _ in self.parts]
+        return self._counts
+
+    def count(self):
+        return sum(self.get_counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset, prepare in self.parts:
+            for obj in queryset:
+                yield prepare(obj) if prepare else obj
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += self.count()
+            objects = self[index:index + 1] if index >= 0 else []
+            if not objects:
+                raise IndexError('ChainedQuerySets index out of range')
+            return objects[0]
+
+        start, stop, step = index.indices(self.count())
+        if step != 1:
+            return list(self)[index]
+        objects = []
+        offset = 0
+        for (queryset, prepare), count in zip(self.parts, self.get_counts()):
+            # range of this part which falls into start..stop
+            part_start = max(start - offset, 0)
+            part_stop = min(stop - offset, count)
+            offset += count
+            if part_start >= part_stop:
+                continue
+            for obj in queryset[part_start:part_stop]:
+                objects.append(prepare(obj) if prepare else obj)
+        return objects
+
+
+class CursorPage(object):
+    """
+    A page of CursorPaginator, links to the neighbour pages with the opaque
+    next_token and previous_token (None if there is no such page).
+    """
+
+    def __init__(self, object_list, paginator, next_token, previous_token):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __repr__(self):
+        return '<Cursor page of {0} objects>'.format(len(self.object_list))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator(object):
+    """
+    Keyset pagination of a queryset, or of the querysets of a
+    ChainedQuerySets. Instead of counting rows and skipping to an offset,
+    every page continues right after (or before) the row a token points to,
+    using the ordering of the querysets, so deep pages cost the same as the
+    first one.
+    """
+    is_cursor = True
+    salt = 'aldryn_events.pagination.CursorPaginator'
+
+    def __init__(self, object_list, per_page):
+        if isinstance(object_list, ChainedQuerySets):
+            parts = object_list.parts
+        else:
+            parts = [(object_list, None)]
+        self.parts = []
+        for queryset, prepare in parts:
+            fields = get_unique_ordering(queryset)
+            # order_by() keeps the direction set by reverse()
+            self.parts.append((queryset.order_by(*fields), prepare, fields))
+        self.per_page = int(per_page)
+
+    def get_seek_filters(self, queryset, fields, values, backwards):
+        features = connections[queryset.db].features
+        descending = not queryset.query.standard_ordering
+        return get_seek_q_filters(
+            fields, values, descending != backwards,
+            features.nulls_order_largest)
+
+    def make_token(self, direction, part, obj):
+        fields = self.parts[part][2]
+        values = []
+        for field in fields:
+            value = getattr(obj, field.lstrip('-'))
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps([direction, part, values], salt=self.salt,
+                             compress=True)
+
+    def read_token(self, token):
+        try:
+            direction, part, values = signing.loads(token, salt=self.salt)
+            queryset, prepare, fields = self.parts[part]
+            if direction not in ('next', 'previous'):
+                raise ValueError(direction)
+            values = [
+                to_python(queryset, field.lstrip('-'), value)
+                for field, value in zip(fields, values)
+            ]
+        except (signing.BadSignature, ValidationError, ValueError,
+                TypeError, IndexError, FieldDoesNotExist):
+            raise InvalidPage(_('Invalid page.'))
+        return direction, part, values
+
+    def page(self, token=None):
+        if not token:
+            return self.forwards(0, None)
+        direction, part, values = self.read_token(token)
+        if direction == 'next':
+            return self.forwards(part, values)
+        return self.backwards(part, values)
+
+    def fetch(self, part, values, limit, backwards):
+        queryset, prepare, fields = self.parts[part]
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filters(
+                queryset, fields, values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+        return [(part, obj) for obj in queryset[:limit]]
+
+    def forwards(self, part, values):
+        # one more row than needed tells if there is a next page
+        rows = []
+        for current in range(part, len(self.parts)):
+            rows.extend(self.fetch(
+                current, values if current == part else None,
+                self.per_page + 1 - len(rows), backwards=False))
+            if len(rows) > self.per_page:
+                break
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        # a page starting after a row always has a previous page
+        return self.make_page(rows, has_next, values is not None)
+
+    def backwards(self, part, values):
+        rows = []
+        for current in range(part, -1, -1):
+            rows.extend(self.fetch(
+                current, values if current == part else None,
+                self.per_page + 1 - len(rows), backwards=True))
+            if len(rows) > self.per_page:
+                break
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self.make_page(rows, True, has_previous)
+
+    def make_page(self, rows, has_next, has_previous):
+        next_token = previous_token = None
+        if rows and has_next:
+            next_token = self.make_token('next', *rows[-1])
+        if rows and has_previous:
+            previous_token = self.make_token('previous', *rows[0])
+        object_list = []
+        for part, obj in rows:
+            prepare = self.parts[part][1]
+            object_list.append(prepare(obj) if prepare else obj)
+        return CursorPage(object_list, self, next_token, previous_token)
+
+
+def to_python(queryset, name, value):
+    if name in queryset.query.annotations:
+        # e.g. is_ongoing, compared as it came from the database
+        return value
+    opts = queryset.model._meta
+    field = opts.pk if name == 'pk' else opts.get_field(name)
+    return field.to_python(value)
+
+
+def get_unique_ordering(queryset):
+    """
+    Returns the ordering fields of queryset, with pk added if they do not
+    end with it already.
+    """
+    fields = tuple(queryset.query.order_by or
+                   queryset.model._meta.ordering)
+    pk_names = ('pk', queryset.model._meta.pk.name)
+    if fields and fields[-1].lstrip('-') in pk_names:
+        return fields
+    return fields + ('pk',)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-rendering of the upcoming and calendar plugins.
+
+After an event changed, the first request rendering one of those plugins
+builds its cached events again (see `cms_plugins.EventsCacheMixin`).
+`prerender_plugins()` builds them ahead of the requests, for every published
+plugin of the affected events configs and every language in which it is
+shown. With ALDRYN_EVENTS_PLUGIN_PRERENDER = True that happens inline, once
+the change of an event is committed; otherwise the prerender_event_plugins
+management command can run it, e.g. periodically from a worker. Plugins
+which are cached already are not built again.
+
+The events are cached, not the rendered plugins, since their templates add
+to sekizai blocks of the page.
+"""
+from __future__ import unicode_literals
+
+import itertools
+import threading
+
+from django.utils.translation import override
+
+from cms.utils.i18n import get_language_list
+
+from .cache import on_commit
+from .conf import settings
+from .loader import EventLoader
+from .utils import get_valid_languages
+
+# (database alias, events config pk) -> number of the last change waiting
+# for its transaction to be committed, per thread like the connections
+_local = threading.local()
+_numbers = itertools.count()
+
+
+def is_enabled():
+    return bool(settings.ALDRYN_EVENTS_PLUGIN_PRERENDER and
+                settings.ALDRYN_EVENTS_PLUGIN_CACHE_TIMEOUT)
+
+
+def get_plugins(app_configs=None):
+    """
+    Returns the published upcoming and calendar plugins, of app_configs (a
+    list of events configs or their pks) if given.
+    """
+    from .models import EventCalendarPlugin, UpcomingPluginItem
+
+    plugins = []
+    for model in (UpcomingPluginItem, EventCalendarPlugin):
+        queryset = model.objects.select_related('app_config').exclude(
+            placeholder__page__publisher_is_draft=True)
+        if app_configs is not None:
+            queryset = queryset.filter(app_config__in=app_configs)
+        plugins.extend(queryset)
+    return plugins
+
+
+def prerender_plugin(instance, languages=None, loader=None):
+    """
+    Builds the cached events of instance for languages (the languages of the
+    site by default). Returns the amount of languages it is shown in.
+    """
+    plugin = instance.get_plugin_class_instance()
+    namespace = plugin.get_namespace(instance)
+    if not namespace:
+        return 0
+    loader = loader or EventLoader()
+    count = 0
+    for language in languages or get_language_list():
+        valid_languages = get_valid_languages(namespace, language)
+        # plugins are not shown in languages without fallback to theirs
+        if instance.language not in valid_languages:
+            continue
+        # like the requests of language
+        with override(language):
+            plugin.prerender(
+                instance, namespace, language, valid_languages, loader)
+        count += 1
+    return count
+
+
+def prerender_plugins(app_configs=None, languages=None):
+    """
+    Pre-renders the plugins of `get_plugins(app_configs)`, returns the
+    amount of plugins pre-rendered in at least one language.
+    """
+    if not settings.ALDRYN_EVENTS_PLUGIN_CACHE_TIMEOUT:
+        return 0
+    # plugins of the same namespace share their queries, like on a page
+    loader = EventLoader()
+    return len([
+        instance for instance in get_plugins(app_configs)
+        if prerender_plugin(instance, languages, loader)])
+
+
+def schedule(app_config_id, using=None):
+    """
+    Pre-renders the plugins of the events config app_config_id once the
+    current transaction of using is committed, once per transaction however
+    many of its events changed.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    key = (using, app_config_id)
+    number = pending[key] = next(_numbers)
+
+    def run():
+        # only the callback of the last change does the work: commit
+        # callbacks run in order, so the events generation was bumped for
+        # every change of the transaction by then (models.py connects
+        # invalidate_events_cache first). Changes of rolled back
+        # transactions are replaced by the next one.
+        if pending.get(key) == number:
+            del pending[key]
+            prerender_plugins([app_config_id])
+
+    on_commit(run, using)
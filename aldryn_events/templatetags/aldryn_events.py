@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from collections import namedtuple
 from datetime import timedelta, date
 
 from django import template
@@ -7,15 +8,15 @@ from django.core.urlresolvers import reverse, NoReverseMatch
 from django.template.loader import get_template
 from django.utils.dates import MONTHS
 from django.utils import timezone
-from django.utils.translation import (
-    ugettext_lazy as _, get_language_from_request,
-)
+from django.utils.translation import ugettext_lazy as _
 from cms.utils.i18n import force_language
 
 from aldryn_apphooks_config.utils import get_app_instance
 
-from ..models import EventsConfig
-from ..utils import build_calendar, get_valid_languages
+from ..loader import get_loader
+from ..utils import (
+    build_calendar_days, build_calendar_range, get_valid_languages,
+)
 
 register = template.Library()
 
@@ -37,7 +38,14 @@ def fallback_aware_namespace_url(context, view_name, namespace, **kwargs):
     :param kwargs: view kwargs
     :return: first resolved url string
     """
-    language = get_language_from_request(context['request'], check_path=True)
+    language = get_loader(context['request']).get_language()
+    return fallback_aware_reverse(view_name, namespace, language, **kwargs)
+
+
+def fallback_aware_reverse(view_name, namespace, language, **kwargs):
+    """
+    Same as fallback_aware_namespace_url, for a given language.
+    """
     valid_languages = get_valid_languages(namespace, language)
     url = ''
     for lang in valid_languages:
@@ -52,27 +60,73 @@ def fallback_aware_namespace_url(context, view_name, namespace, **kwargs):
     return url
 
 
+# reversed once per calendar, the date part of the url is then replaced by
+# the actual date of each day
+DAY_URL_PLACEHOLDER = {'year': '9999', 'month': '12', 'day': '31'}
+
+
+def get_day_url_builder(namespace, language):
+    """
+    Returns a function which returns the url of the events list of a day
+    (the same url as fallback_aware_namespace_url 'events_list-by-day'),
+    with a constant amount of reverse() calls.
+    """
+    url = fallback_aware_reverse(
+        'events_list-by-day', namespace, language, **DAY_URL_PLACEHOLDER)
+    placeholder = '{year}/{month}/{day}/'.format(**DAY_URL_PLACEHOLDER)
+    position = url.rfind(placeholder)
+    if not url:
+        def build_url(day):
+            return ''
+        return build_url
+    if position == -1:
+        # the url patterns do not look like ours, reverse every day
+        def build_url(day):
+            return fallback_aware_reverse(
+                'events_list-by-day', namespace, language,
+                year=day.year, month=day.month, day=day.day)
+        return build_url
+    prefix, suffix = url[:position], url[position + len(placeholder):]
+
+    def build_url(day):
+        return '{0}{1}/{2}/{3}/{4}'.format(
+            prefix, day.year, day.month, day.day, suffix)
+    return build_url
+
+
+class CalendarEntry(namedtuple('CalendarEntry', 'day events css_classes')):
+    """
+    A day of a calendar. Unpacks to (day, events, css_classes), url is the
+    url of the events list of the day if it has events.
+    """
+
+    def __new__(cls, day, events, css_classes, url=''):
+        entry = super(CalendarEntry, cls).__new__(
+            cls, day, events, css_classes)
+        entry.url = url
+        return entry
+
+
 @register.simple_tag(takes_context=True)
 def calendar(context, year, month, language=None, namespace=None):
     template_name = 'aldryn_events/includes/calendar.html'
+    loader = get_loader(context.get('request'))
     if not namespace:
         namespace, config = get_app_instance(context['request'])
     if not language:
-        language = get_language_from_request(
-            context['request'], check_path=True)
+        language = loader.get_language()
     t = get_template(template_name)
-    try:
-        EventsConfig.objects.get(namespace=namespace)
-    except EventsConfig.DoesNotExist:
+    if loader.get_config(namespace) is None:
         context['namespace_error'] = ERROR_MESSAGE.format(namespace)
     else:
         context['calendar_tag'] = build_calendar_context(
-            year, month, language, namespace)
+            year, month, language, namespace, loader.get_site_id(), loader)
     rendered = t.render(context.flatten())
     return rendered
 
 
-def build_calendar_context(year, month, language, namespace, site_id=None):
+def build_calendar_context(year, month, language, namespace, site_id=None,
+                           loader=None):
     # if not have a selected date
     today = timezone.now().date()
     if not all([year, month]):
@@ -80,37 +134,49 @@ def build_calendar_context(year, month, language, namespace, site_id=None):
         month = today.month
 
     year, month = int(year), int(month)
-    current_date = date(year, month, 1)
+    calendar_days = build_calendar_days(
+        year, month, language, namespace, site_id, today=today,
+        loader=loader)
+    return make_calendar_context(
+        date(year, month, 1), calendar_days, namespace, today,
+        get_day_url_builder(namespace, language))
 
+
+def build_calendar_range_context(start_year, start_month, months, language,
+                                 namespace, site_id=None):
+    """
+    Returns a list of calendar contexts (as built by build_calendar_context)
+    for a number of consecutive months, built from a single events query.
+    """
+    today = timezone.now().date()
+    calendars = build_calendar_range(
+        start_year, start_month, months, language, namespace, site_id,
+        today=today)
+    build_url = get_day_url_builder(namespace, language)
+    return [
+        make_calendar_context(
+            current_date, calendar_days, namespace, today, build_url)
+        for current_date, calendar_days in calendars.items()
+    ]
+
+
+def make_calendar_context(current_date, calendar_days, namespace, today,
+                          build_url):
     context = {
         'today': today,
         'current_date': current_date,
         'last_month': current_date - timedelta(days=1),
         'next_month': (current_date + timedelta(days=31)).replace(day=1),
-        'label': u"{0} {1}".format(MONTHS.get(int(month)), year),
+        'label': u"{0} {1}".format(
+            MONTHS.get(current_date.month), current_date.year),
         'namespace': namespace
     }
 
     # add css classes here instead in template
     # TODO: can configure css classes in appconfig ;)
-    _calendar = build_calendar(year, month, language, namespace, site_id)
-    calendar_list = []
-    for day, events in _calendar.items():
-        css = []
-        if events:
-            for event in events:
-                if event.start_date == day:
-                    css.append('events')
-                    break
-            else:
-                css.append('multiday-events')
-        if day.weekday() in [5, 6]:
-            css.append('weekend')
-        if day == today:
-            css.append('today')
-        # disable days that isn't from this month
-        if day <= context['last_month'] or day >= context['next_month']:
-            css.append('disabled')
-        calendar_list.append((day, events, ' '.join(css)))
-    context['calendar'] = calendar_list
+    context['calendar'] = [
+        CalendarEntry(day, events, ' '.join(flags),
+                      build_url(day) if events else '')
+        for day, events, flags in calendar_days
+    ]
     return context
@@ -9,6 +9,7 @@ from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.urlresolvers import reverse, clear_url_caches
+from django.db.models import Model
 
 from django.test import RequestFactory, TransactionTestCase
 from django.utils.timezone import get_current_timezone
@@ -20,8 +21,10 @@ from cms.middleware.toolbar import ToolbarMiddleware
 from cms.utils.i18n import force_language
 from cms.exceptions import AppAlreadyRegistered
 from cms.utils.conf import get_cms_setting
+from contextlib import contextmanager
 from datetime import datetime
 
+import mock
 from djangocms_helper.utils import create_user
 
 from aldryn_events.cms_apps import EventListAppHook
@@ -149,6 +152,28 @@ class EventTestCaseSetupMixin(object):
             if module in sys.modules:
                 del sys.modules[module]
 
+    @contextmanager
+    def assertNoDeferredLoads(self):
+        """
+        Fails if a deferred field (see only() and defer()) of any model is
+        loaded within the block, e.g. by a template using a field which is
+        not part of a projection.
+        """
+        loads = []
+        refresh_from_db = Model.refresh_from_db
+
+        def record_loads(instance, using=None, fields=None, **kwargs):
+            if fields:
+                loads.extend('{0}.{1}'.format(
+                    instance.__class__.__name__, field) for field in fields)
+            return refresh_from_db(instance, using, fields, **kwargs)
+
+        with mock.patch.object(Model, 'refresh_from_db', record_loads):
+            yield
+        if loads:
+            self.fail('Deferred fields were loaded: {0}'.format(
+                ', '.join(loads)))
+
     def create_super_user(self, user_name, user_password):
 
         super_user = create_user(
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths. They are skipped unless the
+ALDRYN_EVENTS_BENCHMARKS environment variable is set, e.g.:
+
+    ALDRYN_EVENTS_BENCHMARKS=1 python test_settings.py
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import os
+import random
+import timeit
+import unittest
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python < 2.7
+    from django.utils.datastructures import SortedDict as OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+from django.db import connection
+from django.utils import timezone
+
+from aldryn_events.index import IntervalIndex
+from aldryn_events.models import Event
+from aldryn_events.utils import (
+    bucket_calendar_events, filter_events_by_daterange, get_calendar_dates,
+    get_event_q_filters, update_monthdates, use_daterange,
+)
+
+from .base import EventBaseTestCase
+
+BENCHMARKS = bool(os.environ.get('ALDRYN_EVENTS_BENCHMARKS'))
+
+
+def report(name, **timings):
+    print('\n{0}: {1}'.format(name, ', '.join(
+        '{0}={1:.2f}ms'.format(key, value * 1000)
+        for key, value in sorted(timings.items()))))
+
+
+def best_of(func, repeat=5, number=10):
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def make_events(first_date, count, max_days, spread=60):
+    random.seed(count)
+    events = []
+    for pk in range(count):
+        start_date = first_date + datetime.timedelta(
+            days=random.randint(-spread // 2, spread))
+        end_date = start_date + datetime.timedelta(
+            days=random.randint(0, max_days))
+        events.append(Event(pk=pk, start_date=start_date, end_date=end_date))
+    return sorted(events, key=lambda event: event.start_date)
+
+
+@unittest.skipUnless(BENCHMARKS, 'set ALDRYN_EVENTS_BENCHMARKS to run')
+class CalendarBenchmark(unittest.TestCase):
+
+    def legacy_bucketing(self, monthdates, events):
+        first_date, last_date = monthdates[0], monthdates[-1]
+        ongoing = [event for event in events
+                   if event.start_date < first_date and
+                   event.end_date > last_date]
+        ongoing_pks = set(event.pk for event in ongoing)
+        result = OrderedDict((date, ongoing[:]) for date in monthdates)
+        for event in events:
+            if event.pk not in ongoing_pks:
+                update_monthdates(result, event, first_date, last_date)
+        return result
+
+    def test_bucket_calendar_events(self):
+        monthdates = get_calendar_dates(2015, 2)
+        for count in (100, 500, 1000):
+            events = make_events(monthdates[0], count, max_days=90)
+            report(
+                'build_calendar bucketing, {0} multi-day events'.format(count),
+                legacy=best_of(
+                    lambda: self.legacy_bucketing(monthdates, events)),
+                offsets=best_of(
+                    lambda: bucket_calendar_events(monthdates, events)),
+            )
+
+
+def make_index_entries(count, first_date=datetime.date(2000, 1, 1)):
+    random.seed(count)
+    first = first_date.toordinal()
+    entries = []
+    for pk in range(1, count + 1):
+        start = first + random.randint(0, 365 * 20)
+        # mostly single day events, some multi-day and a few long ones
+        span = random.choice((0, 0, 0, 1, 2, 5, 14, 90))
+        entries.append((start, start + span, pk, 0, ('en',)))
+    return entries
+
+
+@unittest.skipUnless(BENCHMARKS, 'set ALDRYN_EVENTS_BENCHMARKS to run')
+class IntervalIndexBenchmark(unittest.TestCase):
+
+    def test_interval_index(self):
+        first_date, last_date = datetime.date(2010, 3, 1), datetime.date(
+            2010, 4, 11)
+        first, last = first_date.toordinal(), last_date.toordinal()
+        for count in (10000, 100000, 1000000):
+            entries = make_index_entries(count)
+            if tracemalloc:
+                tracemalloc.start()
+            start = timeit.default_timer()
+            index = IntervalIndex(entries)
+            build = timeit.default_timer() - start
+            if tracemalloc:
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                print('\ninterval index, {0} events: {1:.1f}MB'.format(
+                    count, memory / 1024.0 / 1024.0))
+
+            def scan():
+                return [pk for start, end, pk, publish_at, languages
+                        in entries if start <= last and end >= first]
+
+            self.assertEqual(
+                sorted(index.overlapping(first_date, last_date)),
+                sorted(scan()))
+            report(
+                'interval index, {0} events, 6 weeks window'.format(count),
+                build=build,
+                linear_scan=best_of(scan, repeat=3, number=1),
+                index=best_of(
+                    lambda: index.overlapping(first_date, last_date)),
+            )
+
+
+@unittest.skipUnless(BENCHMARKS, 'set ALDRYN_EVENTS_BENCHMARKS to run')
+class IntervalIndexDatabaseBenchmark(EventBaseTestCase):
+
+    def test_interval_index_against_database(self):
+        first_date, last_date = datetime.date(2010, 3, 1), datetime.date(
+            2010, 4, 11)
+        publish_at = timezone.now() - datetime.timedelta(days=1)
+        for count in (10000, 100000):
+            Event.objects.all().delete()
+            entries = make_index_entries(count)
+            Event.objects.bulk_create(
+                Event(pk=pk, app_config=self.app_config, publish_at=publish_at,
+                      start_date=datetime.date.fromordinal(start),
+                      end_date=datetime.date.fromordinal(end),
+                      effective_end_date=datetime.date.fromordinal(end))
+                for start, end, pk, _, _ in entries)
+            events = Event.objects.published().filter(
+                app_config=self.app_config)
+            index = IntervalIndex(entries)
+
+            def query():
+                return list(events.filter(get_event_q_filters(
+                    first_date, last_date)).values_list('pk', flat=True))
+
+            self.assertEqual(
+                sorted(index.overlapping(first_date, last_date)),
+                sorted(query()))
+            report(
+                'overlap lookup, {0} events, 6 weeks window'.format(count),
+                database=best_of(query, repeat=3, number=3),
+                index=best_of(
+                    lambda: index.overlapping(first_date, last_date)),
+            )
+
+
+@unittest.skipUnless(BENCHMARKS, 'set ALDRYN_EVENTS_BENCHMARKS to run')
+class DateRangeBenchmark(EventBaseTestCase):
+
+    def test_daterange_against_q_filters(self):
+        if not use_daterange(connection.alias):
+            raise unittest.SkipTest('needs a PostgreSQL database')
+        first_date, last_date = datetime.date(2010, 3, 1), datetime.date(
+            2010, 4, 11)
+        publish_at = timezone.now() - datetime.timedelta(days=1)
+        count = 500000
+        Event.objects.bulk_create((
+            Event(pk=pk, app_config=self.app_config, publish_at=publish_at,
+                  start_date=datetime.date.fromordinal(start),
+                  end_date=datetime.date.fromordinal(end),
+                  effective_end_date=datetime.date.fromordinal(end))
+            for start, end, pk, _, _ in make_index_entries(count)),
+            batch_size=10000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE aldryn_events_event')
+        events = Event.objects.published().filter(app_config=self.app_config)
+
+        def q_filters():
+            return list(events.filter(get_event_q_filters(
+                first_date, last_date)).values_list('pk', flat=True))
+
+        def daterange():
+            return list(filter_events_by_daterange(
+                events, first_date, last_date).values_list('pk', flat=True))
+
+        self.assertEqual(sorted(q_filters()), sorted(daterange()))
+        report(
+            'overlap query, {0} events, 6 weeks window'.format(count),
+            q_filters=best_of(q_filters, repeat=3, number=3),
+            daterange=best_of(daterange, repeat=3, number=3),
+        )
@@ -1,18 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
 from collections import namedtuple
 import six
 
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 
 from cms.utils.i18n import force_language
 from parler.tests.utils import override_parler_settings
 from parler.utils.conf import add_default_language_settings
 
 from .base import EventBaseTestCase, tz_datetime
+from ..cache import get_generation
 from ..models import Event
+from ..utils import filter_events_by_dates
 
 DateKey = namedtuple('DateKey', 'key_name, should_pass')
 
@@ -171,6 +174,43 @@ class EventTestCase(EventBaseTestCase):
         self.assertTrue(event1.takes_single_day)
         self.assertFalse(event2.takes_single_day)
 
+    def test_event_effective_end_date_follows_dates(self):
+        event = self.create_event(
+            title='blah', start_date=tz_datetime(2015, 1, 1)
+        )
+        event = Event.objects.get(pk=event.pk)
+        self.assertEqual(event.effective_end_date, datetime.date(2015, 1, 1))
+        # e.g. a valid daterange on PostgreSQL
+        day = datetime.date(2015, 1, 1)
+        self.assertEqual(
+            list(filter_events_by_dates(Event.objects.all(), day, day)),
+            [event])
+        event.end_date = datetime.date(2015, 1, 5)
+        event.save()
+        event = Event.objects.get(pk=event.pk)
+        self.assertEqual(event.effective_end_date, datetime.date(2015, 1, 5))
+
+        # not rejected without clean()
+        event.end_date = datetime.date(2014, 12, 30)
+        event.save()
+        event = Event.objects.get(pk=event.pk)
+        self.assertEqual(event.effective_end_date, datetime.date(2015, 1, 1))
+        # e.g. a valid daterange on PostgreSQL
+        day = datetime.date(2015, 1, 1)
+        self.assertEqual(
+            list(filter_events_by_dates(Event.objects.all(), day, day)),
+            [event])
+
+    def test_events_generation_changes_on_commit(self):
+        generation = get_generation()
+        with transaction.atomic():
+            event = self.create_event(
+                title='blah', start_date=tz_datetime(2015, 1, 1))
+            event.delete()
+            # caches rebuilt now would be keyed by the old generation
+            self.assertEqual(get_generation(), generation)
+        self.assertNotEqual(get_generation(), generation)
+
     def test_create_event(self):
         """
         We can create an event with a name in two languages
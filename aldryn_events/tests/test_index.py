@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import transaction
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from cms.utils.i18n import force_language
+
+from aldryn_events.index import IntervalIndex, get_index, registry
+from aldryn_events.models import Event
+from aldryn_events.utils import build_calendar
+
+from .base import EventBaseTestCase, tz_datetime
+
+
+def entry(pk, start, end=None, publish_at=0, languages=('en',)):
+    start = datetime.date(*start).toordinal()
+    end = datetime.date(*end).toordinal() if end else start
+    return start, end, pk, publish_at, languages
+
+
+class IntervalIndexTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.index = IntervalIndex([
+            entry(1, (2015, 2, 1), (2015, 2, 10)),
+            entry(2, (2015, 2, 15), (2015, 4, 27)),
+            entry(3, (2015, 1, 1), (2015, 2, 15)),
+            entry(4, (2015, 1, 1)),
+            entry(5, (2015, 2, 16), languages=('de',)),
+            entry(6, (2014, 1, 1), (2016, 1, 1)),
+            entry(7, (2015, 2, 18), publish_at=2e9),
+        ])
+
+    def overlapping(self, first, last, **kwargs):
+        return self.index.overlapping(
+            datetime.date(*first), datetime.date(*last),
+            now=tz_datetime(2015, 2, 1), **kwargs)
+
+    def test_overlapping(self):
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.overlapping((2015, 2, 1), (2015, 2, 28)),
+                         [6, 3, 1, 2, 5])
+        self.assertEqual(self.overlapping((2015, 2, 16), (2015, 2, 16)),
+                         [6, 2, 5])
+        self.assertEqual(self.overlapping((2015, 1, 1), (2015, 1, 1)),
+                         [6, 3, 4])
+        self.assertEqual(self.overlapping((2017, 1, 1), (2017, 12, 31)), [])
+
+    def test_overlapping_languages(self):
+        self.assertEqual(
+            self.overlapping((2015, 2, 16), (2015, 2, 16), languages=['en']),
+            [6, 2])
+
+    def test_add_and_remove(self):
+        self.index.remove(3)
+        self.index.remove(6)
+        self.index.add(*entry(8, (2015, 2, 1)))
+        self.index.add(*entry(1, (2015, 3, 1)))
+        self.assertNotIn(3, self.index)
+        self.assertEqual(self.overlapping((2015, 2, 1), (2015, 2, 28)),
+                         [8, 2, 5])
+        self.index.remove_language(8, 'en')
+        self.assertEqual(
+            self.overlapping((2015, 2, 1), (2015, 2, 1), languages=['en']),
+            [])
+
+
+@override_settings(ALDRYN_EVENTS_INTERVAL_INDEX=True)
+class IntervalIndexEventsTestCase(EventBaseTestCase):
+
+    def setUp(self):
+        super(IntervalIndexEventsTestCase, self).setUp()
+        registry.clear()
+
+    def tearDown(self):
+        registry.clear()
+        super(IntervalIndexEventsTestCase, self).tearDown()
+
+    def test_index_follows_event_changes(self):
+        event = self.create_event(
+            title='Event', start_date=tz_datetime(2015, 2, 3),
+            publish_at=tz_datetime(2015, 1, 1))
+        namespace = self.app_config.namespace
+        index = get_index(namespace)
+        february = (datetime.date(2015, 2, 1), datetime.date(2015, 2, 28))
+        self.assertEqual(index.overlapping(*february), [event.pk])
+
+        # changes are applied to the loaded index
+        event.start_date = tz_datetime(2015, 3, 3)
+        event.save()
+        other = self.create_event(
+            title='Other', start_date=tz_datetime(2015, 2, 5),
+            publish_at=tz_datetime(2015, 1, 1))
+        self.assertIs(get_index(namespace), index)
+        self.assertEqual(index.overlapping(*february), [other.pk])
+        self.assertEqual(
+            index.overlapping(*february, languages=['de']), [])
+        other.create_translation('de', title='Andere', slug='andere')
+        self.assertEqual(
+            index.overlapping(*february, languages=['de']), [other.pk])
+
+        other.delete()
+        self.assertEqual(index.overlapping(*february), [])
+
+    def test_index_follows_committed_changes_only(self):
+        namespace = self.app_config.namespace
+        index = get_index(namespace)
+        february = (datetime.date(2015, 2, 1), datetime.date(2015, 2, 28))
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.create_event(
+                    title='Event', start_date=tz_datetime(2015, 2, 3),
+                    publish_at=tz_datetime(2015, 1, 1))
+                raise ValueError('rolled back')
+        self.assertEqual(index.overlapping(*february), [])
+
+        # values as assigned, not as loaded from the database
+        with force_language('en'):
+            event = Event.objects.create(
+                title='Event', slug='event', start_date='2015-02-03',
+                publish_at='2015-01-01T00:00:00+00:00',
+                app_config=self.app_config)
+        self.assertIs(get_index(namespace), index)
+        self.assertEqual(index.overlapping(*february), [event.pk])
+
+    def test_build_calendar_with_index(self):
+        now = timezone.now()
+        event = self.create_event(
+            title='Long term event',
+            start_date=now - datetime.timedelta(days=100),
+            end_date=now + datetime.timedelta(days=100),
+            publish_at=now - datetime.timedelta(days=100))
+        with override_settings(ALDRYN_EVENTS_INTERVAL_INDEX=False):
+            expected = build_calendar(
+                now.year, now.month, 'en', self.app_config.namespace)
+        output = build_calendar(
+            now.year, now.month, 'en', self.app_config.namespace)
+        self.assertIsNotNone(get_index(self.app_config.namespace))
+        self.assertEqual(output, expected)
+        self.assertIn(event, output[now.date()])
+
+    @override_settings(ALDRYN_EVENTS_INTERVAL_INDEX_MAX_EVENTS=1)
+    def test_memory_budget(self):
+        for day in (1, 2):
+            self.create_event(
+                title='Event {0}'.format(day),
+                start_date=tz_datetime(2015, 2, day),
+                publish_at=tz_datetime(2015, 1, 1))
+        self.assertIsNone(get_index(self.app_config.namespace))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.six import StringIO
+
+from cms.signals import urls_need_reloading
+from cms.utils.i18n import force_language
+
+from aldryn_events.cms_menus import EventsMenu
+from aldryn_events.listings import use_listings
+from aldryn_events.models import Event, EventListing
+from aldryn_events.utils import build_calendar
+
+from .base import EventBaseTestCase, get_page_request, tz_datetime
+
+
+@override_settings(ALDRYN_EVENTS_LISTINGS=True)
+class EventListingTestCase(EventBaseTestCase):
+
+    def setUp(self):
+        super(EventListingTestCase, self).setUp()
+        self.page = self.create_base_pages()
+        self.reload_urls()
+
+    def create_events(self):
+        return [
+            self.create_event(
+                title='Event {0}'.format(num),
+                slug='event-{0}'.format(num),
+                start_date=tz_datetime(2030, 1, 1 + num),
+                publish_at=tz_datetime(2014, 1, 1),
+                de={'title': 'Ereignis {0}'.format(num),
+                    'slug': 'ereignis-{0}'.format(num)})
+            for num in range(3)
+        ]
+
+    def test_listings_follow_event_changes(self):
+        event = self.create_event(
+            title='Event', slug='event', start_date=tz_datetime(2030, 1, 1),
+            publish_at=tz_datetime(2014, 1, 1))
+        listing = EventListing.objects.get(event=event, language='en')
+        self.assertEqual(listing.title, 'Event')
+        self.assertEqual(listing.url, event.get_absolute_url('en'))
+        self.assertEqual(listing.namespace, self.app_config.namespace)
+        # german falls back to english
+        listing = EventListing.objects.get(event=event, language='de')
+        self.assertEqual(
+            (listing.title, listing.translation_language), ('Event', 'en'))
+
+        event.create_translation('de', title='Ereignis', slug='ereignis')
+        listing = EventListing.objects.get(event=event, language='de')
+        self.assertEqual(
+            (listing.title, listing.slug, listing.translation_language),
+            ('Ereignis', 'ereignis', 'de'))
+        self.assertEqual(listing.url, event.get_absolute_url('de'))
+
+        event.start_date = tz_datetime(2030, 2, 1).date()
+        event.end_date = tz_datetime(2030, 2, 3).date()
+        event.save()
+        self.assertEqual(
+            set(EventListing.objects.values_list(
+                'start_date', 'effective_end_date')),
+            set([(event.start_date, event.end_date)]))
+
+        event.delete()
+        self.assertFalse(EventListing.objects.exists())
+
+    def test_rebuild_after_apphook_changes(self):
+        with override_settings(ALDRYN_EVENTS_LISTINGS=False):
+            self.create_events()
+        self.assertFalse(EventListing.objects.exists())
+
+        urls_need_reloading.send(sender=None)
+        self.assertFalse(use_listings())
+        stdout = StringIO()
+        call_command('rebuild_event_listings', stdout=stdout)
+        self.assertIn('Rebuilt 6 event listings.', stdout.getvalue())
+        self.assertTrue(use_listings())
+
+    def test_calendar_and_menu_from_listings(self):
+        self.create_events()
+        namespace = self.app_config.namespace
+        request = get_page_request(self.page, path='/de/', language='de')
+
+        def read():
+            calendar = [
+                [event.pk if isinstance(event, Event) else event.event_id
+                 for event in events]
+                for events in build_calendar(2030, 1, 'de', namespace)
+                .values()]
+            with force_language('de'):
+                nodes = [(node.title, node.url, node.id)
+                         for node in EventsMenu(None).get_nodes(request)]
+            return calendar, nodes
+
+        with override_settings(ALDRYN_EVENTS_LISTINGS=False):
+            expected = read()
+        self.assertEqual(read(), expected)
+        self.assertEqual(
+            expected[1][0][:2],
+            ('Ereignis 0', Event.objects.first().get_absolute_url('de')))
+
+        with force_language('de'):
+            with CaptureQueriesContext(connection) as queries:
+                EventsMenu(None).get_nodes(request)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_plugins_from_listings(self):
+        from cms import api
+
+        events = self.create_events()
+        page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        placeholder = page.placeholders.get(slot='content')
+        api.add_plugin(placeholder, 'UpcomingPlugin', 'en',
+                       app_config=self.app_config)
+        list_plugin = api.add_plugin(placeholder, 'EventListCMSPlugin', 'en',
+                                     app_config=self.app_config)
+        list_plugin.events = [events[2], events[0]]
+        list_plugin.save()
+        page.publish('en')
+        self.reload_urls()
+
+        def render():
+            cache.clear()
+            return self.client.get(page.get_absolute_url('en'))
+
+        with override_settings(ALDRYN_EVENTS_LISTINGS=False):
+            expected = render().content
+        with CaptureQueriesContext(connection) as queries:
+            response = render()
+        self.assertEqual(response.content, expected)
+        # events were read from the listings only
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'aldryn_events_event_translation' in query['sql']])
+        for event in events:
+            self.assertContains(
+                response, '<a href="{0}">{1}</a>'.format(
+                    event.get_absolute_url('en'), event.get_title()),
+                count=1 if event is events[1] else 2)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from cms import api
+
+from aldryn_events.loader import EventLoader, get_loader
+from aldryn_events.models import Event
+
+from .base import EventBaseTestCase, tz_datetime
+
+
+class EventLoaderTestCase(EventBaseTestCase):
+
+    def create_events(self):
+        for num in range(4):
+            self.create_event(
+                title='Event {0}'.format(num), slug='event-{0}'.format(num),
+                start_date=tz_datetime(2030, 1, 1 + num),
+                publish_at=tz_datetime(2014, 1, 1))
+
+    def test_upcoming_events_share_a_query(self):
+        self.create_events()
+        loader = EventLoader()
+        events = Event.objects.namespace(self.app_config.namespace)
+        key_parts = (self.app_config.namespace, 'en')
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                len(loader.get_upcoming(events, key_parts, 3)), 3)
+            first = loader.get_upcoming(events, key_parts, 2)
+        self.assertEqual([event.get_title() for event in first],
+                         ['Event 0', 'Event 1'])
+        # more events and past events are fetched again
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                len(loader.get_upcoming(events, key_parts, 4)), 4)
+            loader.get_upcoming(events, key_parts, 1, past=True)
+        self.assertEqual(loader.stats['upcoming'], {'hits': 1, 'misses': 2})
+        self.assertEqual(loader.coalesced, 1)
+
+    def test_plugins_of_a_page_share_lookups(self):
+        self.create_base_pages()
+        self.create_events()
+        page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        placeholder = page.placeholders.get(slot='content')
+        for count in (3, 2):
+            api.add_plugin(placeholder, 'UpcomingPlugin', 'en',
+                           app_config=self.app_config, latest_entries=count)
+        api.add_plugin(placeholder, 'CalendarPlugin', 'en',
+                       app_config=self.app_config)
+        page.publish('en')
+        self.reload_urls()
+
+        response = self.client.get(page.get_absolute_url('en'))
+        self.assertContains(response, 'Event 2', count=1)
+        stats = get_loader(response.wsgi_request).stats
+        self.assertEqual(stats['upcoming'], {'hits': 1, 'misses': 1})
+        # the calendar plugin, its calendar and the calendar tag of its
+        # template
+        self.assertEqual(stats['calendar_events'], {'hits': 2, 'misses': 1})
+        self.assertEqual(stats['valid_languages']['misses'], 1)
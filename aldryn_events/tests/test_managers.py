@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import unittest
+
+from django.db import connection
 from django.utils.translation import override
-from aldryn_events.models import Event
+from aldryn_events.models import Event, EventsConfig
+from aldryn_events.utils import filter_events_by_dates, use_daterange
 from cms import api
 
 from .base import EventBaseTestCase, tz_datetime
@@ -73,6 +77,59 @@ class TestEventsManager(EventManagerTestCase):
                     [self.ev1, self.ev2, self.ev3, self.ev7]]
         self.assertEqual(entries, expected)
 
+    def test_ongoing_first(self):
+        now = tz_datetime(2014, 4, 7, 9, 30)
+        # latest first, ongoing events are still listed first
+        events = Event.objects.published(now).order_by(
+            'start_date', 'pk').reverse()
+
+        def listing(queryset):
+            return [(event.pk, bool(event.is_ongoing)) for event in queryset]
+
+        self.assertEqual(listing(events.ongoing_first(now)), [
+            (self.ev3.pk, True), (self.ev7.pk, True), (self.ev2.pk, True),
+            (self.ev1.pk, True), (self.ev5.pk, False), (self.ev4.pk, False),
+        ])
+        # the ongoing events past the limit keep their place
+        self.assertEqual(listing(events.ongoing_first(now, limit=2)), [
+            (self.ev3.pk, True), (self.ev7.pk, True), (self.ev5.pk, False),
+            (self.ev4.pk, False), (self.ev2.pk, False), (self.ev1.pk, False),
+        ])
+
+    def test_for_listing_projections(self):
+        now = tz_datetime(2014, 4, 7, 9, 30)
+        events = Event.objects.future(now)
+        with self.assertNumQueries(2):
+            teasers = list(events.for_listing(projection='teaser'))
+        with self.assertNoDeferredLoads():
+            self.assertEqual([event.get_title() for event in teasers],
+                             ['ev2', 'ev3', 'ev4', 'ev5'])
+            self.assertEqual(teasers[0].start(), self.ev2.start())
+        self.assertIn('publish_at', teasers[0].get_deferred_fields())
+        # other fields are still loaded when used, but the helper fails
+        with self.assertRaises(AssertionError):
+            with self.assertNoDeferredLoads():
+                teasers[0].publish_at
+
+        events = list(events.for_listing())
+        self.assertEqual(events[0].get_deferred_fields(), set())
+
+    def test_for_listing_prefetches_all_translations(self):
+        event = self.create_event(
+            title='ev8', start_date=tz_datetime(2014, 4, 20),
+            publish_at=tz_datetime(2014, 4, 1), de={'title': 'ev8 de'})
+        # a language outside of the fallbacks of en
+        event.create_translation('fr', title='ev8 fr')
+        with override('en'):
+            listed = Event.objects.filter(pk=event.pk).for_listing().get()
+        # parler takes the prefetched translations for all of them
+        with self.assertNumQueries(0):
+            self.assertEqual(sorted(listed.get_available_languages()),
+                             ['de', 'en', 'fr'])
+            self.assertTrue(listed.has_translation('fr'))
+            self.assertEqual(listed.safe_translation_getter(
+                'title', language_code='fr'), 'ev8 fr')
+
     def test_published(self):
         now = tz_datetime(2014, 4, 1)
         entries = [event.pk for event in Event.objects.published(now)]
@@ -179,3 +236,93 @@ class TestEventsAppConfigManager(EventManagerAppConfigTestCase,
         for e in range(0, len([latest_first]) - 1):
             self.assertLess(content.find(latest_first[e].title),
                             content.find(latest_first[e + 1].title))
+
+
+class EventQueryPlanTestCase(EventBaseTestCase):
+
+    """
+    Checks that the hot path queries are served by the composite indexes of
+    Event instead of scanning the whole events table.
+    """
+
+    def get_composite_indexes(self):
+        table = Event._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table)
+        return [name for name, constraint in constraints.items()
+                if constraint['index'] and len(constraint['columns']) > 1]
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            # a few rows would always be read sequentially on PostgreSQL
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute('EXPLAIN ' + sql, params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertUsesCompositeIndex(self, queryset):
+        plan = self.explain(queryset)
+        table = Event._meta.db_table
+        self.assertNotIn('SCAN TABLE {0}'.format(table), plan)
+        self.assertNotIn('SCAN {0}'.format(table), plan.split('\n'))
+        self.assertNotIn('Seq Scan on {0}'.format(table), plan)
+        self.assertTrue(
+            any(index in plan for index in self.get_composite_indexes()),
+            plan)
+
+    def test_query_plans(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise unittest.SkipTest(
+                'query plans are only checked on SQLite and PostgreSQL')
+        self.create_event(
+            title='ev1',
+            start_date=tz_datetime(2014, 4, 5),
+            publish_at=tz_datetime(2014, 4, 1)
+        )
+        events = Event.objects.namespace(self.app_config.namespace)
+        now = tz_datetime(2014, 4, 6)
+        self.assertUsesCompositeIndex(events.upcoming(5, now=now))
+        self.assertUsesCompositeIndex(events.past(5, now=now))
+        self.assertUsesCompositeIndex(events.archive(now=now))
+        self.assertUsesCompositeIndex(events.ongoing(now=now))
+
+    def test_daterange_query_plan(self):
+        if not use_daterange(connection.alias):
+            raise unittest.SkipTest('daterange filters are PostgreSQL only')
+        events = filter_events_by_dates(
+            Event.objects.namespace(self.app_config.namespace),
+            tz_datetime(2014, 3, 31).date(), tz_datetime(2014, 5, 11).date())
+        self.assertIn('aldryn_events_event_daterange_gist',
+                      self.explain(events))
+
+
+class EventsConfigCacheTestCase(EventBaseTestCase):
+
+    def test_namespace_config_is_cached(self):
+        namespace = self.app_config.namespace
+        Event.objects.namespace(namespace)
+        with self.assertNumQueries(0):
+            qs = Event.objects.namespace(namespace)
+        self.assertTrue(qs.query.standard_ordering)
+
+        # saving the config invalidates the cached configs
+        self.app_config.latest_first = True
+        self.app_config.save()
+        with self.assertNumQueries(1):
+            qs = Event.objects.namespace(namespace)
+        self.assertFalse(qs.query.standard_ordering)
+
+    def test_missing_namespace(self):
+        self.assertEqual(list(Event.objects.namespace('missing')), [])
+        with self.assertNumQueries(0):
+            Event.objects.namespace('missing')
+        EventsConfig.objects.create(namespace='missing', latest_first=True)
+        self.assertFalse(
+            Event.objects.namespace('missing').query.standard_ordering)
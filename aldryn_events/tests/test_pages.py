@@ -1,20 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
 import mock
 
 from django.conf import settings
 from django.core import mail
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
 
 from importlib import import_module
 from cms import api
+from cms.signals import urls_need_reloading
 from cms.utils.i18n import force_language
 from parler.utils.context import switch_language
 from pyquery import PyQuery
 
+from aldryn_events.cms_menus import EventsMenu
 from aldryn_events.models import Event, EventsConfig
-from .base import EventBaseTestCase, tz_datetime
+from .base import EventBaseTestCase, get_page_request, tz_datetime
 
 
 class EventPagesTestCase(EventBaseTestCase):
@@ -316,6 +322,116 @@ class EventPagesTestCase(EventBaseTestCase):
             self.assertContains(response, ev1.get_absolute_url())
             self.assertContains(response, ev6.get_absolute_url())
 
+    def test_events_menu_queries_do_not_grow_with_event_count(self):
+        page = self.create_base_pages()
+        self.reload_urls()
+        request = get_page_request(page, path='/en/')
+
+        def add_events(count):
+            first = Event.objects.count()
+            for num in range(first, first + count):
+                self.create_event(
+                    title='Event {0}'.format(num),
+                    start_date=tz_datetime(2030, 1, 1 + num),
+                    publish_at=tz_datetime(2014, 1, 1),
+                    de={'title': 'Ereignis {0}'.format(num),
+                        'slug': 'ereignis-{0}'.format(num)})
+
+        def get_nodes():
+            with force_language('en'), self.assertNoDeferredLoads():
+                with CaptureQueriesContext(connection) as queries:
+                    nodes = EventsMenu(None).get_nodes(request)
+            return len(nodes), len(queries)
+
+        add_events(2)
+        nodes, queries = get_nodes()
+        self.assertEqual(nodes, 2)
+        add_events(6)
+        self.assertEqual(get_nodes(), (8, queries))
+
+    def get_menu_nodes(self, page, language='en'):
+        menu = EventsMenu(None)
+        menu.instance = page
+        request = get_page_request(page, path='/{0}/'.format(language),
+                                   language=language)
+        with force_language(language):
+            return [(node.title, node.url)
+                    for node in menu.get_nodes(request)]
+
+    def create_dated_events(self):
+        now = timezone.now()
+        return [
+            self.create_event(
+                title='Event {0}'.format(days), slug='event-{0}'.format(days),
+                start_date=now + datetime.timedelta(days=days),
+                publish_at=tz_datetime(2014, 1, 1))
+            for days in (-10, 1, 5, 20)
+        ]
+
+    def test_events_menu_upcoming_events(self):
+        page = self.create_base_pages()
+        self.reload_urls()
+        events = self.create_dated_events()
+        expected = [(event.get_title(), event.get_absolute_url('en'))
+                    for event in events]
+        self.assertEqual(self.get_menu_nodes(page), expected)
+        with self.settings(ALDRYN_EVENTS_MENU_UPCOMING_COUNT=2):
+            self.assertEqual(self.get_menu_nodes(page), expected[1:3])
+        with self.settings(ALDRYN_EVENTS_MENU_UPCOMING_DAYS=10):
+            self.assertEqual(self.get_menu_nodes(page), expected[1:3])
+        self.app_config.latest_first = True
+        self.app_config.save()
+        with self.settings(ALDRYN_EVENTS_MENU_UPCOMING_COUNT=1):
+            self.assertEqual(self.get_menu_nodes(page), expected[1:2])
+
+    def test_events_menu_nodes_are_cached(self):
+        page = self.create_base_pages()
+        self.reload_urls()
+        event = self.create_dated_events()[1]
+        nodes = self.get_menu_nodes(page)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_menu_nodes(page), nodes)
+        event.set_current_language('en')
+        event.title = 'Changed'
+        event.save()
+        self.assertIn('Changed', [title for title, url
+                                  in self.get_menu_nodes(page)])
+
+    def test_events_menu_follows_moved_apphook_page(self):
+        page = self.create_base_pages()
+        self.reload_urls()
+        event = self.create_dated_events()[1]
+        self.get_menu_nodes(page)
+        title = page.get_title_obj('en')
+        title.slug = 'moved-events'
+        title.path = 'root-page/moved-events'
+        title.save()
+        page.publish('en')
+        # sent by the CMS after the request which changed the page
+        urls_need_reloading.send(sender=None)
+        self.reload_urls()
+        url = event.get_absolute_url('en')
+        self.assertIn('/moved-events/', url)
+        self.assertIn(url, [node_url for node_title, node_url
+                            in self.get_menu_nodes(page.reload())])
+
+    @override_settings(ALDRYN_EVENTS_MENU_UPCOMING_COUNT=1)
+    def test_events_menu_adds_current_event(self):
+        page = self.create_base_pages()
+        page.navigation_extenders = 'EventsMenu'
+        page.save()
+        page.publish('en')
+        self.reload_urls()
+        past_event = self.create_dated_events()[0]
+        url = past_event.get_absolute_url('en')
+        with force_language('en'):
+            response = self.client.get(url)
+            nodes = response.context['cms_menu_renderer'].get_nodes()
+        self.assertEqual(
+            [(node.title, node.parent.id) for node in nodes
+             if node.get_absolute_url() == url],
+            [(past_event.get_title(), page.publisher_public.pk)])
+
 
 class RegistrationTestCase(EventBaseTestCase):
 
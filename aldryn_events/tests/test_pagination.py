@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.core.paginator import InvalidPage, Paginator
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.http import urlquote
+
+from cms import api
+
+from aldryn_events.models import Event
+from aldryn_events.pagination import ChainedQuerySets, CursorPaginator
+from aldryn_events.views import make_outdated
+
+from .base import EventBaseTestCase, tz_datetime
+
+
+class ChainedQuerySetsTestCase(EventBaseTestCase):
+
+    def setUp(self):
+        super(ChainedQuerySetsTestCase, self).setUp()
+        for day in range(1, 8):
+            self.create_event(
+                title='Event {0}'.format(day),
+                start_date=tz_datetime(2015, 2, day),
+                publish_at=tz_datetime(2015, 1, 1))
+        events = Event.objects.order_by('start_date')
+        self.first = events.filter(start_date__lte=tz_datetime(2015, 2, 3))
+        self.second = events.filter(start_date__gt=tz_datetime(2015, 2, 3))
+        self.chained = ChainedQuerySets(
+            [self.first, (self.second, make_outdated)])
+
+    def titles(self, events):
+        return [(event.get_title(), getattr(event, 'is_outdated', False))
+                for event in events]
+
+    def test_slicing(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.chained), 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.chained.count(), 7)
+        # only the overlapped querysets are asked for the rows of the slice
+        with self.assertNumQueries(1):
+            events = self.chained[0:2]
+        self.assertEqual(self.titles(events),
+                         [('Event 1', False), ('Event 2', False)])
+        self.assertEqual(
+            self.titles(self.chained[2:5]),
+            [('Event 3', False), ('Event 4', True), ('Event 5', True)])
+        self.assertEqual(self.titles(self.chained[6:10]), [('Event 7', True)])
+        self.assertEqual(self.chained[10:], [])
+        self.assertEqual(self.titles([self.chained[-1]]), [('Event 7', True)])
+        self.assertRaises(IndexError, lambda: self.chained[7])
+        self.assertEqual(self.titles(self.chained),
+                         self.titles(self.chained[:]))
+
+    def test_paginator(self):
+        paginator = Paginator(self.chained, 3)
+        self.assertEqual(paginator.num_pages, 3)
+        # counted once, the page only touches the second queryset
+        with self.assertNumQueries(1):
+            page = paginator.page(2)
+        self.assertEqual(
+            self.titles(page),
+            [('Event 4', True), ('Event 5', True), ('Event 6', True)])
+
+    def test_cursor_paginator(self):
+        # the second queryset is walked in descending order
+        chained = ChainedQuerySets([
+            self.first, (self.second.order_by('-start_date'), make_outdated)])
+        paginator = CursorPaginator(chained, 3)
+        # one more row is looked up, to know if there is a next page
+        with self.assertNumQueries(2):
+            page = paginator.page()
+        self.assertEqual(
+            self.titles(page),
+            [('Event 1', False), ('Event 2', False), ('Event 3', False)])
+        self.assertFalse(page.has_previous())
+        # a page spanning both querysets, no counting and no offsets
+        with self.assertNumQueries(2):
+            page = paginator.page(page.next_token)
+        self.assertEqual(
+            self.titles(page),
+            [('Event 7', True), ('Event 6', True), ('Event 5', True)])
+        with self.assertNumQueries(1):
+            last_page = paginator.page(page.next_token)
+        self.assertEqual(self.titles(last_page), [('Event 4', True)])
+        self.assertFalse(last_page.has_next())
+
+        # and back again
+        page = paginator.page(last_page.previous_token)
+        self.assertEqual(
+            self.titles(page),
+            [('Event 7', True), ('Event 6', True), ('Event 5', True)])
+        page = paginator.page(page.previous_token)
+        self.assertEqual(
+            self.titles(page),
+            [('Event 1', False), ('Event 2', False), ('Event 3', False)])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_cursor_paginator_invalid_token(self):
+        paginator = CursorPaginator(self.first, 2)
+        token = paginator.page().next_token
+        self.assertRaises(InvalidPage, paginator.page, 'invalid')
+        self.assertRaises(InvalidPage, paginator.page, token[:-1])
+        # tokens of other paginators are refused as well
+        other = CursorPaginator(self.chained, 10)
+        self.assertRaises(InvalidPage, other.page, token.replace(':', '!'))
+
+
+@override_settings(ALDRYN_EVENTS_PAGINATE_BY=2)
+class EventListPaginationTestCase(EventBaseTestCase):
+
+    def setUp(self):
+        super(EventListPaginationTestCase, self).setUp()
+        root_page = self.create_root_page()
+        page = api.create_page(
+            'Events en', self.template, 'en', published=True, parent=root_page,
+            apphook='EventListAppHook',
+            apphook_namespace=self.app_config.namespace,
+            publication_date=tz_datetime(2014, 1, 8)
+        )
+        page.publish('en')
+        self.reload_urls()
+
+    def test_upcoming_list_pages_through_archive(self):
+        for year in (2030, 2031, 2032):
+            self.create_event(
+                title='Future {0}'.format(year),
+                start_date=tz_datetime(year, 1, 1),
+                publish_at=tz_datetime(2014, 1, 1))
+        for year in (2010, 2011, 2012):
+            self.create_event(
+                title='Past {0}'.format(year),
+                start_date=tz_datetime(year, 1, 1),
+                publish_at=tz_datetime(2009, 1, 1))
+        url = reverse('{0}:events_list'.format(self.app_config.namespace))
+
+        def get_page(number):
+            response = self.client.get(url, {'page': number})
+            return [(event.get_title(), getattr(event, 'is_outdated', False))
+                    for event in response.context['page_obj']]
+
+        self.assertEqual(get_page(1),
+                         [('Future 2030', False), ('Future 2031', False)])
+        self.assertEqual(get_page(2),
+                         [('Future 2032', False), ('Past 2010', True)])
+        self.assertEqual(get_page(3),
+                         [('Past 2011', True), ('Past 2012', True)])
+
+    @override_settings(ALDRYN_EVENTS_CURSOR_PAGINATION=True)
+    def test_cursor_pagination(self):
+        for year in (2030, 2031, 2032):
+            self.create_event(
+                title='Future {0}'.format(year),
+                start_date=tz_datetime(year, 1, 1),
+                publish_at=tz_datetime(2014, 1, 1))
+        for year in (2010, 2011):
+            self.create_event(
+                title='Past {0}'.format(year),
+                start_date=tz_datetime(year, 1, 1),
+                publish_at=tz_datetime(2009, 1, 1))
+        url = reverse('{0}:events_list'.format(self.app_config.namespace))
+
+        def get_page(cursor=None):
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page = response.context['page_obj']
+            return page, [event.get_title() for event in page]
+
+        page, titles = get_page()
+        self.assertEqual(titles, ['Future 2030', 'Future 2031'])
+        page, titles = get_page(page.next_token)
+        self.assertEqual(titles, ['Future 2032', 'Past 2010'])
+        last_page, titles = get_page(page.next_token)
+        self.assertEqual(titles, ['Past 2011'])
+        self.assertFalse(last_page.has_next())
+        page, titles = get_page(last_page.previous_token)
+        self.assertEqual(titles, ['Future 2032', 'Past 2010'])
+
+        # the template links to the neighbour pages
+        response = self.client.get(url, {'cursor': page.next_token})
+        previous_token = response.context['page_obj'].previous_token
+        self.assertContains(
+            response, '?cursor={0}'.format(urlquote(previous_token)))
+        self.assertEqual(
+            self.client.get(url, {'cursor': 'invalid'}).status_code, 404)
+
+    def test_ongoing_first_pages(self):
+        self.app_config.app_data = {'config': {'show_ongoing_first': True}}
+        self.app_config.save()
+        now = timezone.now()
+        for day in (3, 2, 1):
+            self.create_event(
+                title='Ongoing {0}'.format(day),
+                start_date=now - datetime.timedelta(days=day),
+                end_date=now + datetime.timedelta(days=10),
+                publish_at=tz_datetime(2014, 1, 1))
+        for day in (1, 2):
+            self.create_event(
+                title='Upcoming {0}'.format(day),
+                start_date=now + datetime.timedelta(days=day),
+                publish_at=tz_datetime(2014, 1, 1))
+        url = reverse('{0}:events_list'.format(self.app_config.namespace))
+
+        def get_page(**params):
+            context = self.client.get(url, params).context
+            return ([event.get_title() for event in context['ongoing_objects']],
+                    [event.get_title() for event in context['page_obj']],
+                    context['page_obj'])
+
+        # ongoing events come first and are paginated with the others
+        self.assertEqual(get_page(page=1)[:2],
+                         (['Ongoing 3', 'Ongoing 2'], []))
+        self.assertEqual(get_page(page=2)[:2],
+                         (['Ongoing 1'], ['Upcoming 1']))
+        self.assertEqual(get_page(page=3)[:2], ([], ['Upcoming 2']))
+
+        with override_settings(ALDRYN_EVENTS_CURSOR_PAGINATION=True):
+            ongoing, events, page = get_page()
+            self.assertEqual(ongoing, ['Ongoing 3', 'Ongoing 2'])
+            ongoing, events, page = get_page(cursor=page.next_token)
+            self.assertEqual((ongoing, events), (['Ongoing 1'], ['Upcoming 1']))
+            ongoing, events, page = get_page(cursor=page.previous_token)
+            self.assertEqual(ongoing, ['Ongoing 3', 'Ongoing 2'])
+
+        # the other ongoing events are listed along with the upcoming ones
+        with override_settings(ALDRYN_EVENTS_ONGOING_FIRST_LIMIT=1):
+            self.assertEqual(get_page(page=1)[:2],
+                             (['Ongoing 3'], ['Ongoing 2']))
+        # no LIMIT in subqueries, which MySQL does not support
+        sql = str(Event.objects.all().ongoing_first(limit=1).query)
+        self.assertNotIn('LIMIT', sql)
@@ -7,6 +7,9 @@ from cms.models import Placeholder
 from cms.utils.i18n import force_language
 from django.core.urlresolvers import reverse, NoReverseMatch
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.utils.encoding import force_text
 
 import mock
@@ -340,6 +343,167 @@ class EventPluginsTestCase(TestPluginLanguageHelperMixin, EventBaseTestCase):
             'is 5 entries.'
         )
 
+    def test_list_plugins_queries_do_not_grow_with_event_count(self):
+        self.create_base_pages()
+        page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        ph = page.placeholders.get(slot='content')
+        api.add_plugin(ph, 'UpcomingPlugin', 'en', app_config=self.app_config,
+                       latest_entries=20)
+        list_plugin = api.add_plugin(
+            ph, 'EventListCMSPlugin', 'en', app_config=self.app_config)
+        self.reload_urls()
+
+        def add_events(count):
+            first = Event.objects.count()
+            for num in range(first, first + count):
+                self.new_event_from_num(
+                    num, start_date=tz_datetime(2030, 1, 1 + num),
+                    end_date=None, publish_at=tz_datetime(2014, 1, 1))
+            list_plugin.events = Event.objects.all()
+            list_plugin.save()
+            page.publish('en')
+
+        def count_queries():
+            cache.clear()
+            with force_language('en'), self.assertNoDeferredLoads():
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(page.get_absolute_url('en'))
+            # both plugins list all events
+            self.assertContains(
+                response, 'event {0} en'.format(Event.objects.count() - 1),
+                count=2)
+            # publishing the page changes the queries of the CMS menus
+            return len([query for query in queries.captured_queries
+                        if 'aldryn_events' in query['sql']])
+
+        add_events(2)
+        queries = count_queries()
+        add_events(6)
+        self.assertEqual(count_queries(), queries)
+
+    def test_plugins_cache_events_until_they_change(self):
+        self.create_base_pages()
+        page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        ph = page.placeholders.get(slot='content')
+        api.add_plugin(ph, 'UpcomingPlugin', 'en', app_config=self.app_config)
+        api.add_plugin(ph, 'CalendarPlugin', 'en', app_config=self.app_config)
+        page.publish('en')
+        event = self.new_event_from_num(
+            1, start_date=timezone.now() + datetime.timedelta(days=1),
+            end_date=None, publish_at=tz_datetime(2014, 1, 1))
+        self.reload_urls()
+
+        def render(**kwargs):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    page.get_absolute_url('en'), **kwargs)
+            event_queries = [
+                query for query in queries.captured_queries
+                if '"aldryn_events_event"' in query['sql']]
+            return response, event_queries
+
+        response, queries = render()
+        self.assertContains(response, 'event 1 en')
+        self.assertTrue(queries)
+        response, queries = render()
+        self.assertContains(response, 'event 1 en')
+        self.assertEqual(queries, [])
+
+        # saving an event invalidates the cache
+        event.set_current_language('en')
+        event.title = 'changed 1 en'
+        event.save()
+        response, queries = render()
+        self.assertContains(response, 'changed 1 en')
+        self.assertTrue(queries)
+
+        # editors always see the current events
+        self.create_super_user('editor', 'editor')
+        self.client.login(username='editor', password='editor')
+        self.assertTrue(render(data={'edit': ''})[1])
+        self.assertTrue(render(data={'edit': ''})[1])
+
+    @mock.patch('aldryn_events.cache.timezone')
+    def test_plugins_cache_expires_at_the_next_boundary(self, timezone_mock):
+        timezone_mock.now.return_value = tz_datetime(2030, 1, 31, 23)
+        page = self.create_base_pages()
+        ph = page.placeholders.get(slot='content')
+        plugins = [
+            api.add_plugin(ph, plugin_type, 'en', app_config=self.app_config,
+                           cache_duration=7200)
+            for plugin_type in ('UpcomingPlugin', 'CalendarPlugin')]
+
+        def get_expirations():
+            return [
+                plugin.get_plugin_class_instance().get_cache_expiration(
+                    None, plugin, ph)
+                for plugin in plugins]
+
+        # the day (and month) rolls over in an hour
+        self.assertEqual(get_expirations(), [3600, 3600])
+        self.new_event_from_num(
+            1, start_date=tz_datetime(2030, 2, 1), end_date=None,
+            publish_at=tz_datetime(2030, 1, 31, 23, 30))
+        self.assertEqual(get_expirations(), [1800, 1800])
+
+        timezone_mock.now.return_value = tz_datetime(2030, 1, 31, 12)
+        self.assertEqual(get_expirations(), [7200, 7200])
+        for plugin in plugins:
+            plugin.cache_duration = 0
+        self.assertEqual(get_expirations(), [0, 0])
+
+    def test_deferred_plugins(self):
+        self.create_base_pages()
+        page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        ph = page.placeholders.get(slot='content')
+        for plugin_type in ('UpcomingPlugin', 'CalendarPlugin'):
+            api.add_plugin(ph, plugin_type, 'en', app_config=self.app_config,
+                           cache_duration=600, deferred=True)
+        page.publish('en')
+        self.new_event_from_num(
+            1, start_date=timezone.now() + datetime.timedelta(days=1),
+            end_date=None, publish_at=tz_datetime(2014, 1, 1))
+        self.reload_urls()
+
+        response = self.client.get(page.get_absolute_url('en'))
+        self.assertNotContains(response, 'event 1 en')
+        self.assertNotContains(response, 'js-calendar-table')
+        public_page = page.get_public_object()
+        urls = []
+        for plugin in public_page.placeholders.get(
+                slot='content').get_plugins():
+            with force_language('en'):
+                url = reverse(
+                    '{0}:events_plugin'.format(self.app_config.namespace),
+                    kwargs={'pk': plugin.pk})
+            self.assertContains(response, 'data-url="{0}"'.format(url))
+            urls.append(url)
+
+        upcoming, calendar = [self.client.get(url) for url in urls]
+        self.assertContains(upcoming, 'event 1 en')
+        self.assertEqual(upcoming['Cache-Control'], 'max-age=600')
+        self.assertContains(calendar, 'js-calendar-table')
+        self.assertContains(calendar, '<script>')
+
+        # draft plugins are not loaded, editors see them right away
+        draft_plugin = ph.get_plugins()[0]
+        with force_language('en'):
+            url = reverse(
+                '{0}:events_plugin'.format(self.app_config.namespace),
+                kwargs={'pk': draft_plugin.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.create_super_user('editor', 'editor')
+        self.client.login(username='editor', password='editor')
+        response = self.client.get(
+            page.get_absolute_url('en'), data={'edit': ''})
+        self.assertContains(response, 'event 1 en')
+
     @mock.patch('aldryn_events.managers.timezone')
     def test_upcoming_plugin_with_not_existing_ns(self, timezone_mock):
         timezone_mock.now.return_value = tz_datetime(2014, 1, 2)
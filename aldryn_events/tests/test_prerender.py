@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from cms import api
+
+import mock
+
+from .base import EventBaseTestCase, tz_datetime
+
+
+class PrerenderTestCase(EventBaseTestCase):
+
+    def setUp(self):
+        super(PrerenderTestCase, self).setUp()
+        self.create_base_pages()
+        self.page = api.create_page(
+            'Home en', self.template, 'en', published=True, slug='home',
+            parent=self.root_page)
+        placeholder = self.page.placeholders.get(slot='content')
+        for plugin_type in ('UpcomingPlugin', 'CalendarPlugin'):
+            api.add_plugin(placeholder, plugin_type, 'en',
+                           app_config=self.app_config)
+        self.page.publish('en')
+        self.reload_urls()
+
+    def create_event(self, **kwargs):
+        kwargs.setdefault(
+            'start_date', timezone.now() + datetime.timedelta(days=1))
+        return super(PrerenderTestCase, self).create_event(
+            title='Event', slug='event', publish_at=tz_datetime(2014, 1, 1),
+            **kwargs)
+
+    def get_event_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.page.get_absolute_url('en'))
+        self.assertContains(response, 'Event')
+        return [query for query in queries.captured_queries
+                if '"aldryn_events_event"' in query['sql']]
+
+    @override_settings(ALDRYN_EVENTS_PLUGIN_PRERENDER=True)
+    def test_event_changes_prerender_plugins(self):
+        event = self.create_event()
+        self.assertEqual(self.get_event_queries(), [])
+
+        event.start_date = event.start_date + datetime.timedelta(days=1)
+        event.save()
+        self.assertEqual(self.get_event_queries(), [])
+
+    @override_settings(ALDRYN_EVENTS_PLUGIN_PRERENDER=True)
+    def test_changes_of_a_transaction_prerender_plugins(self):
+        # e.g. the admin, saving the event and its translations
+        with transaction.atomic():
+            event = self.create_event(
+                de={'title': 'Ereignis', 'slug': 'ereignis'})
+            event.save()
+        self.assertEqual(self.get_event_queries(), [])
+
+    @override_settings(ALDRYN_EVENTS_PLUGIN_PRERENDER=True)
+    def test_prerender_once_per_transaction(self):
+        with mock.patch('aldryn_events.prerender.prerender_plugins') as mocked:
+            with transaction.atomic():
+                event = self.create_event(
+                    de={'title': 'Ereignis', 'slug': 'ereignis'})
+                event.save()
+                self.assertFalse(mocked.called)
+        mocked.assert_called_once_with([self.app_config.pk])
+
+    def test_prerender_command(self):
+        self.create_event()
+        stdout = StringIO()
+        call_command('prerender_event_plugins', stdout=stdout,
+                     namespaces=[self.app_config.namespace])
+        self.assertIn('Pre-rendered 2 plugins.', stdout.getvalue())
+        self.assertEqual(self.get_event_queries(), [])
+
+        # plugins of other namespaces only
+        call_command('prerender_event_plugins', stdout=stdout,
+                     namespaces=['unknown'])
+        self.assertIn('Pre-rendered 0 plugins.', stdout.getvalue())
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from datetime import date
+
 import mock
 
 from django.template import Template
@@ -10,6 +12,7 @@ from pyquery import PyQuery
 from sekizai.context import SekizaiContext
 
 from aldryn_events.models import EventsConfig
+from aldryn_events.templatetags import aldryn_events as tags
 
 from .base import EventBaseTestCase, tz_datetime, get_page_request
 
@@ -119,3 +122,27 @@ class TagsTestCase(EventBaseTestCase):
             event_url = '/2015/1/{0}/'.format(day)
             rendered_url = links[position].attrib['href']
             self.assertGreater(rendered_url.find(event_url), -1)
+
+    @mock.patch('aldryn_events.templatetags.aldryn_events.timezone')
+    def test_calendar_day_urls_are_reversed_once(self, timezone_mock):
+        timezone_mock.now.return_value = tz_datetime(2015, 1, 10, 12)
+        self.create_base_pages(multilang=True)
+        self.reload_urls()
+        namespace = self.app_config.namespace
+        with override('en'):
+            with mock.patch.object(
+                    tags, 'reverse', wraps=tags.reverse) as reverse:
+                context = tags.build_calendar_context(
+                    2015, 1, 'en', namespace)
+            self.assertEqual(reverse.call_count, 1)
+            entries = [entry for entry in context['calendar'] if entry.events]
+            self.assertEqual(len(entries), 11)
+            for entry in entries:
+                self.assertEqual(entry.url, tags.fallback_aware_reverse(
+                    'events_list-by-day', namespace, 'en',
+                    year=entry.day.year, month=entry.day.month,
+                    day=entry.day.day))
+        # entries still unpack like the plain tuples
+        day, events, css_classes = context['calendar'][0]
+        self.assertEqual((day, list(events)), (date(2014, 12, 29), []))
+        self.assertEqual(context['calendar'][0].url, '')
@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from collections import OrderedDict
 from operator import attrgetter
 
 import datetime
+import mock
+
+from django.core.urlresolvers import NoReverseMatch, reverse
 from django.utils import timezone, translation
 
-from aldryn_events.models import EventsConfig
-from aldryn_events.utils import build_calendar
+from cms import api
+
+from aldryn_events.models import Event, EventsConfig
+from aldryn_events.utils import (
+    build_calendar, build_calendar_days, build_calendar_range,
+    build_events_by_year,
+    build_events_by_year_from_counts, bucket_calendar_events, DayEvents,
+    filter_events_by_dates, get_calendar_dates, get_event_q_filters,
+    get_event_url, get_event_urls, get_month_event_counts,
+    get_valid_languages, update_monthdates, use_daterange,
+)
 
 from .base import EventBaseTestCase, tz_datetime
 
@@ -166,6 +179,232 @@ class UtilsTestCase(EventBaseTestCase):
         day_before = now - datetime.timedelta(days=1)
         self.assertNotIn(event, output[day_before.date()])
 
+    def test_bucket_calendar_events_matches_day_by_day_update(self):
+        monthdates = get_calendar_dates(2015, 2)
+        first_date, last_date = monthdates[0], monthdates[-1]
+        spans = [
+            # (start, end) relative to the first displayed date
+            (-40, 80), (-3, 50), (-10, 5), (0, None), (3, 3), (3, 10),
+            (12, None), (20, 60), (41, None), (-1, 0),
+        ]
+        events = [
+            Event(pk=index,
+                  start_date=first_date + datetime.timedelta(days=start),
+                  end_date=(None if end is None else
+                            first_date + datetime.timedelta(days=end)))
+            for index, (start, end) in enumerate(spans)
+        ]
+
+        expected = OrderedDict((date, []) for date in monthdates)
+        ongoing = [event for event in events
+                   if event.start_date < first_date and
+                   event.end_date and event.end_date > last_date]
+        for date in monthdates:
+            expected[date].extend(ongoing)
+        for event in events:
+            if event not in ongoing:
+                update_monthdates(expected, event, first_date, last_date)
+
+        days, starts = bucket_calendar_events(monthdates, events)
+        self.assertEqual(len(days), len(monthdates))
+        for date, day_events, has_start in zip(monthdates, days, starts):
+            self.assertEqual(list(day_events), expected[date])
+            self.assertEqual(
+                has_start,
+                any(event.start_date == date for event in day_events))
+        # events running through the whole calendar are not copied
+        self.assertIs(days[0].shared, days[-1].shared)
+
+    def test_day_events(self):
+        day_events = DayEvents(['a', 'b'], ['c'])
+        self.assertEqual(len(day_events), 3)
+        self.assertEqual(day_events, ['a', 'b', 'c'])
+        self.assertEqual(day_events[2], 'c')
+        self.assertEqual(day_events[-3], 'a')
+        self.assertEqual(day_events[1:], ['b', 'c'])
+        self.assertIn('c', day_events)
+        self.assertFalse(DayEvents([], []))
+        with self.assertRaises(IndexError):
+            day_events[3]
+
+    def test_build_calendar_days_flags(self):
+        self.create_event(
+            title='Multiday',
+            start_date=tz_datetime(2015, 1, 30),
+            end_date=tz_datetime(2015, 2, 3),
+            publish_at=tz_datetime(2015, 1, 1)
+        )
+        days = build_calendar_days(
+            2015, 2, 'en', self.app_config.namespace,
+            today=datetime.date(2015, 2, 4))
+        flags = dict((day, day_flags) for day, events, day_flags in days)
+        self.assertEqual(flags[datetime.date(2015, 1, 30)],
+                         ['events', 'disabled'])
+        self.assertEqual(flags[datetime.date(2015, 2, 1)],
+                         ['multiday-events', 'weekend'])
+        self.assertEqual(flags[datetime.date(2015, 2, 3)],
+                         ['multiday-events'])
+        self.assertEqual(flags[datetime.date(2015, 2, 4)], ['today'])
+
+    def test_build_calendar_range(self):
+        self.create_event(
+            title='Across the year',
+            start_date=tz_datetime(2014, 12, 20),
+            end_date=tz_datetime(2015, 2, 3),
+            publish_at=tz_datetime(2014, 1, 1)
+        )
+        self.create_event(
+            title='March',
+            start_date=tz_datetime(2015, 3, 30),
+            publish_at=tz_datetime(2014, 1, 1)
+        )
+        today = datetime.date(2015, 2, 4)
+        calendars = build_calendar_range(
+            2014, 12, 5, 'en', self.app_config.namespace, today=today)
+        self.assertEqual(list(calendars.keys()), [
+            datetime.date(2014, 12, 1), datetime.date(2015, 1, 1),
+            datetime.date(2015, 2, 1), datetime.date(2015, 3, 1),
+            datetime.date(2015, 4, 1)])
+        for month_start, calendar_days in calendars.items():
+            self.assertEqual(
+                calendar_days,
+                build_calendar_days(month_start.year, month_start.month, 'en',
+                                    self.app_config.namespace, today=today))
+
+    def test_filter_events_by_dates(self):
+        for title, start, end in (('Before', (2015, 1, 2), None),
+                                  ('Into', (2015, 1, 20), (2015, 2, 1)),
+                                  ('Within', (2015, 2, 3), None),
+                                  ('Around', (2014, 12, 1), (2015, 4, 1)),
+                                  ('Out of', (2015, 2, 20), (2015, 3, 1)),
+                                  ('After', (2015, 3, 10), None)):
+            self.create_event(
+                title=title,
+                start_date=tz_datetime(*start),
+                end_date=tz_datetime(*end) if end else None,
+                publish_at=tz_datetime(2014, 1, 1)
+            )
+        events = Event.objects.order_by('start_date')
+        first_date, last_date = datetime.date(2015, 2, 1), datetime.date(
+            2015, 2, 28)
+        filtered = filter_events_by_dates(events, first_date, last_date)
+        self.assertEqual(
+            [event.get_title() for event in filtered],
+            ['Around', 'Into', 'Within', 'Out of'])
+        self.assertEqual(
+            list(filtered),
+            list(events.filter(get_event_q_filters(first_date, last_date))))
+        self.assertEqual(use_daterange(events.db), '&&' in str(filtered.query))
+
+    def test_get_month_event_counts(self):
+        for day in (1, 5, 20):
+            self.create_event(
+                title='March {0}'.format(day),
+                de={'title': 'Maerz {0}'.format(day),
+                    'slug': 'maerz-{0}'.format(day)},
+                start_date=tz_datetime(2015, 3, day),
+                publish_at=tz_datetime(2015, 1, 1)
+            )
+        self.create_event(
+            title='May',
+            start_date=tz_datetime(2015, 5, 2),
+            end_date=tz_datetime(2015, 6, 2),
+            publish_at=tz_datetime(2015, 1, 1)
+        )
+        self.create_event(
+            title='Next year',
+            start_date=tz_datetime(2016, 1, 2),
+            publish_at=tz_datetime(2015, 1, 1)
+        )
+        # en and de translations would be joined twice, but are counted once
+        events = (Event.objects.namespace(self.app_config.namespace)
+                               .active_translations('en')
+                               .order_by('start_date'))
+        with self.assertNumQueries(1):
+            counts = get_month_event_counts(events)
+        self.assertEqual(counts, [(2015, 3, 3), (2015, 5, 1), (2016, 1, 1)])
+        self.assertEqual(
+            get_month_event_counts(events.order_by('-start_date')),
+            [(2016, 1, 1), (2015, 5, 1), (2015, 3, 3)])
+
+    def test_build_events_by_year_from_counts(self):
+        for start_date in ((2015, 3, 1), (2015, 3, 9), (2016, 11, 2)):
+            self.create_event(
+                title='Event {0}-{1}-{2}'.format(*start_date),
+                start_date=tz_datetime(*start_date),
+                publish_at=tz_datetime(2015, 1, 1))
+        events = (Event.objects.namespace(self.app_config.namespace)
+                               .order_by('-start_date'))
+        for config in ({}, {'is_archive_view': True},
+                       {'display_months_without_events': False}):
+            expected = build_events_by_year(events, **config)
+            built = build_events_by_year_from_counts(
+                get_month_event_counts(events), **config)
+            self.assertEqual([y['year'] for y in built], [2016, 2015])
+            for year, expected_year in zip(built, expected):
+                self.assertEqual(year['event_count'],
+                                 expected_year['event_count'])
+                for month, expected_month in zip(year['months'],
+                                                 expected_year['months']):
+                    for key in ('month', 'event_count', 'has_events',
+                                'display_in_navigation'):
+                        self.assertEqual(month[key], expected_month[key])
+
+
+class ValidLanguagesTestCase(EventBaseTestCase):
+
+    def test_get_valid_languages_is_memoized(self):
+        namespace = self.app_config.namespace
+        page = self.create_base_pages(multilang=False)
+        self.reload_urls()
+        self.assertEqual(get_valid_languages(namespace, 'en'), ['en'])
+        with mock.patch('aldryn_events.utils.is_valid_namespace') as valid:
+            with self.assertNumQueries(0):
+                self.assertEqual(get_valid_languages(namespace, 'en'), ['en'])
+            self.assertFalse(valid.called)
+
+        # apphook changes reload the URLconf
+        api.create_title('de', 'Events de', page)
+        page.publish('de')
+        self.reload_urls()
+        self.assertEqual(get_valid_languages(namespace, 'en'), ['en', 'de'])
+
+
+class EventUrlsTestCase(EventBaseTestCase):
+
+    def test_event_urls_reverse_once_per_language(self):
+        self.create_base_pages()
+        self.reload_urls()
+        events = [
+            self.create_event(
+                title='Event {0}'.format(num), slug='event-{0}'.format(num),
+                start_date=tz_datetime(2015, 1, 1 + num),
+                de={'title': 'Ereignis {0}'.format(num),
+                    'slug': 'ereignis-{0}'.format(num)})
+            for num in range(5)
+        ]
+        # no german translation, the url falls back to english
+        events.append(self.create_event(
+            title='Event 5', slug='event-5', start_date=tz_datetime(2015, 2, 1)))
+
+        for language in ('en', 'de'):
+            with mock.patch('aldryn_events.utils.reverse',
+                            wraps=reverse) as reverse_mock:
+                urls = get_event_urls(events, language)
+            self.assertEqual(reverse_mock.call_count, 1)
+        with translation.override('de'):
+            expected = reverse(
+                '{0}:events_detail'.format(self.app_config.namespace),
+                kwargs={'slug': 'ereignis-1'})
+        self.assertEqual(urls[events[1].pk], expected)
+        self.assertTrue(urls[events[5].pk].startswith('/en/'))
+
+        self.assertRaises(
+            NoReverseMatch, get_event_url, 'unknown', 'en', 'event-1')
+        self.assertRaises(
+            NoReverseMatch, get_event_url, self.app_config.namespace, 'en',
+            'no spaces')
+
 
 class EventTestCase(EventBaseTestCase):
 
@@ -3,12 +3,17 @@ from __future__ import unicode_literals
 
 import datetime
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils.translation import override
 
 from cms import api
 from cms.utils.i18n import force_language
 
+from aldryn_events import ORDERING_FIELDS
+from aldryn_events.cache import get_cache_stats, reset_cache_stats
 from aldryn_events.models import Event
 from aldryn_events.cms_appconfig import EventsConfig
 
@@ -165,6 +170,100 @@ class TestEventViews(EventBaseTestCase):
         response = self.client.get(url)
         self.assertEquals(response.status_code, 200)
 
+    @override_settings(ALDRYN_EVENTS_PAGINATE_BY=20)
+    def test_event_list_queries_do_not_grow_with_page_size(self):
+        self.reload_urls()
+        url = reverse('{0}:events_list'.format(self.app_config.namespace))
+
+        def add_events(count):
+            first = Event.objects.count()
+            for num in range(first, first + count):
+                data = {
+                    'title': 'Ereignis {0}'.format(num),
+                    'slug': 'ereignis-{0}'.format(num),
+                    'start_date': tz_datetime(2030, 1, 1 + num),
+                    'publish_at': tz_datetime(2014, 1, 1),
+                }
+                # every other event is only translated to german and shown
+                # in the fallback language
+                if num % 2:
+                    self.create_event(de=data)
+                else:
+                    self.create_event(de=dict(data), **dict(
+                        data, title='Event {0}'.format(num),
+                        slug='event-{0}'.format(num)))
+
+        def count_queries():
+            cache.clear()
+            with self.assertNoDeferredLoads():
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+            return len(response.context['object_list']), len(queries)
+
+        add_events(2)
+        self.client.get(url)
+        events, queries = count_queries()
+        self.assertEqual(events, 2)
+        add_events(8)
+        self.assertEqual(count_queries(), (10, queries))
+
+    def test_event_list_navigation_is_cached(self):
+        event_data, kwargs = self.get_new_past_event_data()
+        self.create_event(**event_data)
+        url = reverse("{0}:events_list".format(self.app_config.namespace))
+        reset_cache_stats()
+        response = self.client.get(url)
+        self.assertEqual(get_cache_stats()['navigation'],
+                         {'hits': 0, 'misses': 2})
+        archived = response.context['archived_events_by_year']
+        self.assertEqual(archived[0]['event_count'], 1)
+
+        response = self.client.get(url)
+        self.assertEqual(get_cache_stats()['navigation'],
+                         {'hits': 2, 'misses': 2})
+        self.assertEqual(
+            response.context['archived_events_by_year'][0]['event_count'], 1)
+
+        # any event change invalidates the navigation
+        event_data, kwargs = self.get_new_past_event_data()
+        self.create_event(**event_data)
+        response = self.client.get(url)
+        self.assertEqual(get_cache_stats()['navigation'],
+                         {'hits': 2, 'misses': 4})
+        self.assertEqual(
+            response.context['archived_events_by_year'][0]['event_count'], 2)
+
+    def test_event_year_calendar_view(self):
+        self.setup_calendar_events()
+        url = reverse('{0}:events_calendar-by-year'.format(
+            self.app_config.namespace), kwargs={'year': '2015'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        calendars = response.context['calendars']
+        self.assertEqual(len(calendars), 12)
+        february = dict(
+            (day, events) for day, events, css in calendars[1]['calendar'])
+        self.assertEqual(len(february[datetime.date(2015, 2, 1)]), 2)
+        by_day_url = reverse('{0}:events_list-by-day'.format(
+            self.app_config.namespace),
+            kwargs={'year': '2015', 'month': '2', 'day': '1'})
+        self.assertContains(response, by_day_url)
+
+    def test_event_year_calendar_view_year_range(self):
+        def get(year):
+            return self.client.get(reverse(
+                '{0}:events_calendar-by-year'.format(
+                    self.app_config.namespace), kwargs={'year': year}))
+
+        for year in ('0000', '0001', '9999'):
+            self.assertEqual(get(year).status_code, 404)
+        for year in ('0002', '9998'):
+            response = get(year)
+            self.assertEqual(response.status_code, 200)
+            # no links to the years out of range
+            self.assertIsNone(response.context[
+                'last_year' if year == '0002' else 'next_year'])
+
     def test_event_list_by_day_past_event_1_day_long(self):
         """
         Regression test case for checking that if event was created
@@ -230,6 +329,75 @@ class TestEventViews(EventBaseTestCase):
         response = self.client.get(url)
         self.assertEquals(response.status_code, 200)
 
+    def assertNeighbors(self, events, urls=None):
+        for position, event in enumerate(events):
+            if urls:
+                url = urls[event.pk]
+            else:
+                with override('en'):
+                    url = event.get_absolute_url()
+            response = self.client.get(url)
+            expected_prev = events[position - 1] if position else None
+            expected_next = (events[position + 1]
+                             if position + 1 < len(events) else None)
+            self.assertEqual(response.context['prev_event'], expected_prev)
+            self.assertEqual(response.context['next_event'], expected_next)
+
+    def test_event_detail_neighbors(self):
+        self.reload_urls()
+        dates = [
+            # events sharing start dates, with and without times and end dates
+            dict(start_date=tz_datetime(2015, 2, 1)),
+            dict(start_date=tz_datetime(2015, 2, 1), start_time='10:00'),
+            dict(start_date=tz_datetime(2015, 2, 1), start_time='10:00',
+                 end_date=tz_datetime(2015, 2, 2)),
+            dict(start_date=tz_datetime(2015, 2, 1), start_time='10:00',
+                 end_date=tz_datetime(2015, 2, 2), end_time='09:00'),
+            dict(start_date=tz_datetime(2015, 2, 1), start_time='10:00',
+                 end_date=tz_datetime(2015, 2, 2), end_time='09:00'),
+            dict(start_date=tz_datetime(2015, 2, 1), start_time='08:00'),
+            dict(start_date=tz_datetime(2015, 1, 1)),
+            dict(start_date=tz_datetime(2015, 3, 1),
+                 end_date=tz_datetime(2015, 3, 5)),
+        ]
+        for position, event_dates in enumerate(dates):
+            self.create_event(
+                title='Event {0}'.format(position),
+                de={'title': 'Ereignis {0}'.format(position),
+                    'slug': 'ereignis-{0}'.format(position)},
+                publish_at=tz_datetime(2015, 1, 1), **event_dates)
+        events = list(Event.objects.namespace(self.app_config.namespace)
+                                   .order_by(*ORDERING_FIELDS))
+        self.assertEqual(len(events), len(dates))
+        with override('en'):
+            urls = dict((event.pk, event.get_absolute_url())
+                        for event in events)
+        self.assertNeighbors(events, urls)
+
+        self.app_config.latest_first = True
+        self.app_config.save()
+        self.assertNeighbors(events[::-1], urls)
+
+    @override_settings(ALDRYN_EVENTS_NEIGHBORS_CACHE_TIMEOUT=60)
+    def test_event_detail_neighbors_are_cached(self):
+        self.reload_urls()
+        events = [
+            self.create_event(
+                title='Event {0}'.format(day),
+                start_date=tz_datetime(2015, 2, day),
+                publish_at=tz_datetime(2015, 1, 1))
+            for day in (1, 2, 3)]
+        reset_cache_stats()
+        self.assertNeighbors(events)
+        self.assertNeighbors(events)
+        self.assertEqual(get_cache_stats()['neighbors'],
+                         {'hits': 3, 'misses': 3})
+        # a new event invalidates the neighbors
+        events.insert(0, self.create_event(
+            title='Event 0', start_date=tz_datetime(2015, 1, 15),
+            publish_at=tz_datetime(2015, 1, 1)))
+        self.assertNeighbors(events)
+
     def test_list_view_by_day_output(self):
         # prepare events
         events_list = self.setup_calendar_events()
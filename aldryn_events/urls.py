@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 from django.conf.urls import url
 
-from aldryn_events.views import event_list, event_dates, event_list_archive, event_detail, reset_event_registration
+from aldryn_events.views import (
+    event_list, event_dates, event_list_archive, event_detail, event_plugin, event_year_calendar,
+    reset_event_registration,
+)
 
 urlpatterns = [
     url(r'^$', event_list, name='events_list'),
     url(r'^get-dates/$', event_dates, name='get-calendar-dates'),
     url(r'^get-dates/(?P<year>[0-9]+)/(?P<month>[0-9]+)/$', event_dates, name='get-calendar-dates'),
+    url(r'^calendar/(?P<year>\d{4})/$', event_year_calendar, name='events_calendar-by-year'),
+    url(r'^plugin/(?P<pk>\d+)/$', event_plugin, name='events_plugin'),
     url(r'^(?P<year>\d{4})/$', event_list, name='events_list-by-year'),
     url(r'^(?P<year>\d{4})/(?P<month>\d{1,2})/$', event_list, name='events_list-by-month'),
     url(r'^(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})/$', event_list, name='events_list-by-day'),
@@ -1,21 +1,44 @@
 # -*- coding: utf-8 -*-
 import datetime
 import calendar
+import operator
+import re
 import six
 
+from dateutil.relativedelta import relativedelta
+from functools import reduce
+from itertools import chain
+
 from cms.utils.i18n import force_language, get_language_object
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
-from django.core.urlresolvers import reverse, NoReverseMatch
-from django.db.models import Q
+from django.core.urlresolvers import (
+    get_resolver, get_script_prefix, get_urlconf, reverse, NoReverseMatch,
+)
+from django.db import connections
+from django.db.models import Count, Q
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.http import urlquote
+from django.utils.translation import override
+try:
+    from django.db.models.functions import ExtractMonth, ExtractYear
+except ImportError:
+    # Django < 1.10
+    ExtractMonth = ExtractYear = None
+try:
+    from collections.abc import Sequence
+except ImportError:
+    # Python 2
+    from collections import Sequence
 try:
     from collections import OrderedDict
 except ImportError:
     # Python < 2.7
     from django.utils.datastructures import SortedDict as OrderedDict
-from django.conf import settings
+
+from .conf import settings
+from .index import get_index as get_interval_index
 
 
 def build_months(year, is_archive_view=False):
@@ -30,7 +53,8 @@ def build_months(year, is_archive_view=False):
             'year': year,
             'month': month,
             'date': datetime.date(year, month, 1),
-            'events': []
+            'events': [],
+            'event_count': 0,
         }
     return months
 
@@ -52,14 +76,9 @@ def group_events_by_year(events):
 
 
 def build_events_by_year(events, **config):
-    display_months_without_events = (
-        config.get('display_months_without_events', True)
-    )
-
     # archive view means time runs in reverse. of the current year in a
     # other order
     is_archive_view = config.get('is_archive_view', False)
-    now = timezone.now()
 
     events_by_year = OrderedDict()
     for event in events:
@@ -75,12 +94,85 @@ def build_events_by_year(events, **config):
             events_by_year[year]['months'][event.start_date.month]['events']
             .append(event)
         )
-    flattened_events_by_year = events_by_year.values()
+    for year in events_by_year.values():
+        for month in year['months'].values():
+            month['event_count'] = len(month['events'])
+    return flatten_events_by_year(events_by_year, **config)
+
+
+def get_month_event_counts(events):
+    """
+    Given a queryset of event objects, returns a list of
+    (year, month, event_count) tuples, grouped by the month of start_date.
+    Rows follow the direction of the start_date ordering of the queryset,
+    so that ``latest_first`` and archive ordering are respected.
+
+    Counting happens in a single aggregate query, events are not loaded.
+    """
+    ordering = events.query.order_by or events.model._meta.ordering
+    descending = bool(ordering) and ordering[0].startswith('-')
+    if not events.query.standard_ordering:
+        descending = not descending
+
+    events = events.order_by()
+    if ExtractYear is None:
+        # Django < 1.10 can not group by parts of a date, group by day and
+        # sum up the months here instead
+        rows = (events.values_list('start_date')
+                      .annotate(event_count=Count('pk', distinct=True)))
+        counts = OrderedDict()
+        for start_date, event_count in rows:
+            key = (start_date.year, start_date.month)
+            counts[key] = counts.get(key, 0) + event_count
+        counts = [key + (count,) for key, count in counts.items()]
+    else:
+        counts = list(
+            events.annotate(year=ExtractYear('start_date'),
+                            month=ExtractMonth('start_date'))
+                  .values_list('year', 'month')
+                  .annotate(event_count=Count('pk', distinct=True))
+        )
+    return sorted(counts, reverse=descending)
+
+
+def build_events_by_year_from_counts(counts, **config):
+    """
+    Same as build_events_by_year, but built from (year, month, event_count)
+    rows as returned by get_month_event_counts. The 'events' lists of months
+    are left empty.
+    """
+    is_archive_view = config.get('is_archive_view', False)
+
+    events_by_year = OrderedDict()
+    for year, month, event_count in counts:
+        if year not in events_by_year:
+            events_by_year[year] = {
+                'year': year,
+                'date': datetime.date(year, 1, 1),
+                'months': build_months(year=year,
+                                       is_archive_view=is_archive_view)
+            }
+        events_by_year[year]['months'][month]['event_count'] += event_count
+    return flatten_events_by_year(events_by_year, **config)
+
+
+def flatten_events_by_year(events_by_year, **config):
+    """
+    Turns events_by_year mapping into a list of years and computes the
+    navigation flags of their months. Months are expected to have their
+    'event_count' already set.
+    """
+    display_months_without_events = (
+        config.get('display_months_without_events', True)
+    )
+    is_archive_view = config.get('is_archive_view', False)
+    now = timezone.now()
+
+    flattened_events_by_year = list(events_by_year.values())
     for year in flattened_events_by_year:
-        year['months'] = year['months'].values()
+        year['months'] = list(year['months'].values())
         year['event_count'] = 0
         for month in year['months']:
-            month['event_count'] = len(month['events'])
             year['event_count'] += month['event_count']
             month['has_events'] = bool(month['event_count'])
             month['display_in_navigation'] = (
@@ -200,36 +292,111 @@ def update_monthdates(monthdates, event, first_date, last_date):
 
 def get_event_q_filters(first_date, last_date):
     """
-    Returns tuple of filters applicable to event QuerySet for filtering events
+    Returns filters applicable to event QuerySet for filtering events
     that are happening/visible in between first_date (included) and
     last_date (included).
     :param first_date: datetime.date object, first date for range
     :param last_date: datetime.date object, last date for range
-    :return: tuple of Q objects for .filter() method
+    :return: Q object for .filter() method
     """
-    q_start_in_month_dates = Q(start_date__gte=first_date,
-                               start_date__lte=last_date)
-    q_end_in_month_dates = Q(end_date__gte=first_date,
-                             end_date__lte=last_date)
-    q_end_is_greater = Q(end_date__gt=last_date)
-    # actual filter arguments
-    filter_args = (
-        q_start_in_month_dates |
-        Q(q_end_in_month_dates | q_end_is_greater,
-          start_date__lte=first_date))
-    return filter_args
+    return Q(start_date__lte=last_date, effective_end_date__gte=first_date)
 
 
-def build_calendar(year, month, language, namespace=None, site_id=None):
+def get_ongoing_q_filters(date):
     """
-    Returns complete list of monthdates with events happening in that day
+    Returns a Q object for the events running on date. Unlike
+    get_event_q_filters, events without an end_date never end.
+    """
+    return Q(start_date__lte=date) & (
+        Q(end_date__isnull=True) | Q(end_date__gte=date))
+
+
+def get_seek_q_filters(fields, values, descending=False,
+                       nulls_largest=False):
+    """
+    Returns a Q object for the objects coming after the one with values
+    (of fields) when ordered by fields, as in order_by(*fields), or its
+    reverse() if descending is True. NULL values are ordered the way the
+    database does, nulls_largest is True if NULLs come after any value in
+    ascending order (see `connection.features.nulls_order_largest`). The
+    last field of fields has to be unique and not null.
+    """
+    # (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+    alternatives = []
+    equal = Q()
+    for field, value in zip(fields, values):
+        field_descending = descending
+        if field.startswith('-'):
+            field, field_descending = field[1:], not descending
+        # whether NULLs come after the values in the requested order
+        nulls_after = nulls_largest != field_descending
+        if value is None:
+            if not nulls_after:
+                alternatives.append(equal & Q(**{field + '__isnull': False}))
+            equal &= Q(**{field + '__isnull': True})
+        else:
+            lookup = 'lt' if field_descending else 'gt'
+            after = Q(**{'{0}__{1}'.format(field, lookup): value})
+            if nulls_after:
+                after |= Q(**{field + '__isnull': True})
+            alternatives.append(equal & after)
+            equal &= Q(**{field: value})
+    return reduce(operator.or_, alternatives)
+
+
+class DayEvents(Sequence):
+    """
+    Read-only list of the events of a calendar day. Events which span the
+    whole calendar are shared between all days instead of being copied
+    into each of them, they come first followed by the events of the day.
+    """
+    __slots__ = ('shared', 'own')
+
+    def __init__(self, shared, own=()):
+        self.shared = shared
+        self.own = own
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        shared_len = len(self.shared)
+        if index < 0:
+            index += len(self)
+        if 0 <= index < shared_len:
+            return self.shared[index]
+        return self.own[index - shared_len]
+
+    def __len__(self):
+        return len(self.shared) + len(self.own)
+
+    def __iter__(self):
+        return chain(self.shared, self.own)
+
+    def __eq__(self, other):
+        if isinstance(other, (DayEvents, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def get_calendar_dates(year, month):
+    """
+    Returns the list of dates displayed for given month (with pre/succeeding
+    days for nice layout), always six weeks long.
     """
-    from .models import Event
     month = int(month)
     year = int(year)
 
-    # Get a list of all dates in this month (with pre/succeeding for nice
-    # layout)
     monthdates = list(get_monthdates(month, year))
     if len(monthdates) < 6 * 7:
         # always display six weeks to keep the table layout consistent
@@ -242,38 +409,199 @@ def build_calendar(year, month, language, namespace=None, site_id=None):
             monthdates += next_month[:7]
         else:
             monthdates += next_month[7:14]
+    return monthdates
 
+
+def bucket_calendar_events(monthdates, events):
+    """
+    Distributes events (ordered by start_date) into the days of monthdates.
+    Returns a tuple of a list of DayEvents for each day and a list of flags
+    telling whether an event starts on that day.
+
+    Every event is placed by its start/stop offsets into the grid, events
+    running through the whole grid are shared by all days.
+    """
     first_date = monthdates[0]
     last_date = monthdates[-1]
-    filter_args = get_event_q_filters(first_date, last_date)
+    last_offset = len(monthdates) - 1
+
+    shared = []
+    buckets = [[] for _ in monthdates]
+    starts = [False] * len(monthdates)
+    for event in events:
+        end_date = event.end_date or event.start_date
+        if event.start_date < first_date and end_date > last_date:
+            shared.append(event)
+            continue
+        if event.start_date > last_date or end_date < first_date:
+            continue
+        start_offset = (event.start_date - first_date).days
+        if start_offset >= 0:
+            starts[start_offset] = True
+        else:
+            start_offset = 0
+        stop_offset = min((end_date - first_date).days, last_offset)
+        for offset in range(start_offset, stop_offset + 1):
+            buckets[offset].append(event)
+    return [DayEvents(shared, bucket) for bucket in buckets], starts
+
+
+def get_calendar_events(first_date, last_date, language, namespace=None,
+                        site_id=None):
+    """
+    Returns the list of events visible between first_date and last_date,
+    ordered by start_date. They are `EventListing` instances if the listings
+    are used (see `listings.use_listings`).
+    """
+    from .listings import use_listings
+    from .models import Event, EventListing
     valid_languages = get_valid_languages(namespace, language, site_id)
 
+    if use_listings():
+        # listings exist for the languages events can be resolved in
+        listings = EventListing.objects.published().filter(language=language)
+        if namespace:
+            listings = listings.filter(namespace=namespace)
+        listings = listings.filter(get_event_q_filters(first_date, last_date))
+        return list(listings.order_by('start_date'))
+
     # get all upcoming events, ordered by start_date
     events = (Event.objects.namespace(namespace)
               .published()
               .active_translations(language)
-              .language(language)
-              .filter(filter_args))
+              .language(language))
+    events = filter_events_by_dates(events, first_date, last_date, namespace)
     # use events that can be resolved for this namespace and language
     # with respect to language fallback settings
-    events = events.translated(*valid_languages).order_by('start_date')
+    return list(
+        events.translated(*valid_languages).order_by('start_date'))
+
+
+def get_calendar_events_loader(loader=None):
+    if loader is None:
+        return get_calendar_events
+    return loader.get_calendar_events
+
+
+def build_calendar_days(year, month, language, namespace=None, site_id=None,
+                        today=None, loader=None):
+    """
+    Returns a list of (date, events, flags) for each displayed day of month.
+    flags is a list of 'events' (an event starts that day) or
+    'multiday-events' (only events which started before), 'weekend', 'today'
+    and 'disabled' (day is not part of month). Events are fetched through
+    loader (a `loader.EventLoader`) if given.
+    """
+    month = int(month)
+    monthdates = get_calendar_dates(year, month)
+    events = get_calendar_events_loader(loader)(
+        monthdates[0], monthdates[-1], language, namespace, site_id)
+    return flag_calendar_days(monthdates, events, month, today)
+
+
+def flag_calendar_days(monthdates, events, month, today=None):
+    today = today or timezone.now().date()
+    days, starts = bucket_calendar_events(monthdates, events)
+    calendar_days = []
+    for day, day_events, has_start in zip(monthdates, days, starts):
+        flags = []
+        if has_start:
+            flags.append('events')
+        elif day_events:
+            flags.append('multiday-events')
+        if day.weekday() in (5, 6):
+            flags.append('weekend')
+        if day == today:
+            flags.append('today')
+        if day.month != month:
+            flags.append('disabled')
+        calendar_days.append((day, day_events, flags))
+    return calendar_days
+
+
+def build_calendar_range(start_year, start_month, months, language,
+                         namespace=None, site_id=None, today=None):
+    """
+    Same as build_calendar_days, but for a number of consecutive months.
+    Events of the whole range are fetched with a single query.
+    Returns OrderedDict of first day of month -> list of (date, events,
+    flags) of that month.
+    """
+    first_month = datetime.date(int(start_year), int(start_month), 1)
+    month_starts = [
+        first_month + relativedelta(months=offset)
+        for offset in range(int(months))
+    ]
+    grids = [get_calendar_dates(month_start.year, month_start.month)
+             for month_start in month_starts]
+    if not grids:
+        return OrderedDict()
+    events = get_calendar_events(
+        grids[0][0], grids[-1][-1], language, namespace, site_id)
+
+    calendars = OrderedDict()
+    for month_start, monthdates in zip(month_starts, grids):
+        calendars[month_start] = flag_calendar_days(
+            monthdates, events, month_start.month, today)
+    return calendars
+
+
+def filter_events_by_dates(events, first_date, last_date, namespace=None):
+    """
+    Filters events to the ones happening/visible in between first_date and
+    last_date (both included). Asks the interval index of namespace instead
+    of running the date range query, if the index is enabled.
+    """
+    index = get_interval_index(namespace) if namespace else None
+    if index is not None:
+        pks = index.overlapping(first_date, last_date)
+        # keep well below the limit of query parameters of SQLite
+        if len(pks) <= 500:
+            return events.filter(pk__in=pks)
+    if use_daterange(events.db):
+        return filter_events_by_daterange(events, first_date, last_date)
+    return events.filter(get_event_q_filters(first_date, last_date))
 
-    events_outside_ongoing = events.filter(
-        Q(Q(end_date__isnull=True) | Q(end_date__gt=last_date)),
-        start_date__lt=first_date)
-    all_dates_events = list(events_outside_ongoing)
 
-    def all_dates_events_copy():
-        """Return a copy of events list that should be present on each day"""
-        return all_dates_events[:]
+# same expression as the GiST index of migration 0029, so that PostgreSQL
+# can use the index for the overlap
+DATERANGE_SQL = "daterange({table}.{start}, {table}.{end}, '[]')"
 
-    monthdates = OrderedDict((date, all_dates_events_copy())
-                             for date in monthdates)
 
-    for event in events.exclude(pk__in=events_outside_ongoing):
-        update_monthdates(monthdates, event, first_date, last_date)
+def use_daterange(using):
+    """
+    Returns True if the events of database alias using are filtered by
+    dates with a daterange overlap.
+    """
+    return (connections[using].vendor == 'postgresql' and
+            settings.ALDRYN_EVENTS_POSTGRES_DATERANGE)
 
-    return monthdates
+
+def filter_events_by_daterange(events, first_date, last_date):
+    """
+    PostgreSQL only version of the get_event_q_filters filtering, as a single
+    overlap of the (start_date, effective_end_date) daterange of events with
+    first_date..last_date (both included).
+    """
+    quote_name = connections[events.db].ops.quote_name
+    span = DATERANGE_SQL.format(
+        table=quote_name(events.model._meta.db_table),
+        start=quote_name('start_date'), end=quote_name('effective_end_date'))
+    return events.extra(
+        where=["{0} && daterange(%s, %s, '[]')".format(span)],
+        params=[first_date, last_date])
+
+
+def build_calendar(year, month, language, namespace=None, site_id=None,
+                   loader=None):
+    """
+    Returns complete list of monthdates with events happening in that day
+    """
+    monthdates = get_calendar_dates(year, month)
+    events = get_calendar_events_loader(loader)(
+        monthdates[0], monthdates[-1], language, namespace, site_id)
+    days, starts = bucket_calendar_events(monthdates, events)
+    return OrderedDict(zip(monthdates, days))
 
 
 def date_or_datetime(d, t):
@@ -308,15 +636,123 @@ def is_valid_namespace_for_language(namespace, language_code):
         return is_valid_namespace(namespace)
 
 
+def get_urlconf_memo(memo):
+    """
+    Returns the dict kept in memo for the current URLconf, a new one once
+    the URLconf was reloaded (e.g. after apphook changes), which replaces the
+    resolver.
+    """
+    urlconf = get_urlconf()
+    resolver = get_resolver(urlconf)
+    cached_resolver, values = memo.get(urlconf, (None, None))
+    if cached_resolver is not resolver:
+        values = {}
+        memo[urlconf] = (resolver, values)
+    return values
+
+
+# urlconf -> (resolver, {(namespace, language_code, site_id): languages})
+_valid_languages = {}
+
+
+def clear_valid_languages_cache(**kwargs):
+    _valid_languages.clear()
+
+
 def get_valid_languages(namespace, language_code, site_id=None):
-        langs = [language_code]
-        if site_id is None:
-            site_id = getattr(Site.objects.get_current(), 'pk', None)
-        current_language = get_language_object(language_code, site_id)
-        fallbacks = current_language.get('fallbacks', None)
-        if fallbacks:
-            langs += list(fallbacks)
-        valid_translations = [
-            lang_code for lang_code in langs
-            if is_valid_namespace_for_language(namespace, lang_code)]
-        return valid_translations
+    """
+    Returns language_code and its fallback languages for which namespace can
+    be reversed. Results are memoized until the URLconf is reloaded.
+    """
+    if site_id is None:
+        site_id = getattr(settings, 'SITE_ID', None)
+    languages = get_urlconf_memo(_valid_languages)
+    key = (namespace, language_code, site_id)
+    if key not in languages:
+        languages[key] = tuple(
+            resolve_valid_languages(namespace, language_code, site_id))
+    return list(languages[key])
+
+
+def resolve_valid_languages(namespace, language_code, site_id=None):
+    langs = [language_code]
+    if site_id is None:
+        site_id = getattr(Site.objects.get_current(), 'pk', None)
+    current_language = get_language_object(language_code, site_id)
+    fallbacks = current_language.get('fallbacks', None)
+    if fallbacks:
+        langs += list(fallbacks)
+    valid_translations = [
+        lang_code for lang_code in langs
+        if is_valid_namespace_for_language(namespace, lang_code)]
+    return valid_translations
+
+
+# slug which is reversed once per namespace and language, the urls of events
+# are built by putting their slug in its place (see get_event_url)
+SLUG_PLACEHOLDER = 'aldryn-events-slug'
+# slugs accepted by the events_detail url pattern
+SLUG_RE = re.compile(r'^[\w_-]+$', re.UNICODE)
+
+# urlconf -> (resolver, {(namespace, language_code, script_prefix):
+# (prefix, suffix) or None})
+_event_url_templates = {}
+
+
+def clear_event_url_cache(**kwargs):
+    _event_url_templates.clear()
+
+
+def reverse_event_url(namespace, language_code, slug):
+    name = '{0}:events_detail'.format(namespace) if namespace else (
+        'events_detail')
+    with override(language_code):
+        return reverse(name, kwargs={'slug': slug})
+
+
+def get_event_url_template(namespace, language_code):
+    """
+    Returns the (prefix, suffix) around the slug of the event detail urls of
+    namespace in language_code, or None if they can not be reversed.
+    Results are memoized until the URLconf is reloaded.
+    """
+    templates = get_urlconf_memo(_event_url_templates)
+    key = (namespace, language_code, get_script_prefix())
+    if key not in templates:
+        try:
+            url = reverse_event_url(namespace, language_code, SLUG_PLACEHOLDER)
+        except NoReverseMatch:
+            templates[key] = None
+        else:
+            prefix, _, suffix = url.rpartition(SLUG_PLACEHOLDER)
+            templates[key] = (prefix, suffix)
+    return templates[key]
+
+
+def get_event_url(namespace, language_code, slug):
+    """
+    Returns the url of the event detail view of slug, the same as reversing
+    it but without running reverse() for every event. Raises NoReverseMatch
+    if it can not be reversed.
+    """
+    template = get_event_url_template(namespace, language_code)
+    if template is None or not slug or not SLUG_RE.match(slug):
+        raise NoReverseMatch(
+            'Event detail url of namespace {0!r} not found for slug {1!r} '
+            'and language {2!r}.'.format(namespace, slug, language_code))
+    prefix, suffix = template
+    return prefix + urlquote(slug) + suffix
+
+
+def get_event_urls(events, language_code):
+    """
+    Returns a dict of the urls of events by pk, None for the ones which can
+    not be reversed. The detail url is only reversed once per namespace.
+    """
+    urls = {}
+    for event in events:
+        try:
+            urls[event.pk] = event.get_absolute_url(language_code)
+        except NoReverseMatch:
+            urls[event.pk] = None
+    return urls
@@ -1,33 +1,47 @@
 # -*- coding: utf-8 -*-
 from dateutil.relativedelta import relativedelta
-from itertools import chain
 
 from django import forms
 from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.paginator import InvalidPage
 from django.core.urlresolvers import reverse
-from django.http import Http404
+from django.db import connections
+from django.http import Http404, HttpResponse
 from django.utils import timezone
-from django.utils.cache import add_never_cache_headers
+from django.utils.cache import add_never_cache_headers, patch_response_headers
 from django.utils.translation import get_language_from_request
 from django.views.generic import (
     CreateView,
     FormView,
     ListView,
     TemplateView,
+    View,
 )
 
 from aldryn_apphooks_config.mixins import AppConfigMixin
 from aldryn_apphooks_config.utils import get_app_instance
-from datetime import date
+from cms.models import CMSPlugin
+from cms.plugin_rendering import ContentRenderer
+from datetime import MAXYEAR, MINYEAR, date
 from menus.utils import set_language_changer
+from sekizai.context import SekizaiContext
+from sekizai.helpers import get_varname
 
 from . import request_events_event_identifier, ORDERING_FIELDS
+from .cache import (
+    get_events_cache_timeout, get_navigation_cache_timeout, get_or_build,
+)
 from .forms import EventRegistrationForm
-from .models import Event, Registration, EventCalendarPlugin, EventsConfig
-from .templatetags.aldryn_events import build_calendar_context
+from .loader import get_loader
+from .models import Event, Registration, EventCalendarPlugin
+from .pagination import ChainedQuerySets, CursorPaginator
+from .templatetags.aldryn_events import (
+    build_calendar_context, build_calendar_range_context,
+)
 from .utils import (
-    build_events_by_year, get_event_q_filters, get_valid_languages
+    build_events_by_year_from_counts, filter_events_by_dates,
+    get_month_event_counts, get_seek_q_filters,
 )
 
 
@@ -46,19 +60,44 @@ class NavigationMixin(object):
 
     def get_context_data(self, **kwargs):
         context = super(NavigationMixin, self).get_context_data(**kwargs)
-        qs = (Event.objects.namespace(self.namespace)
-                           .active_translations(self.request_language)
-                           .language(self.request_language))
-        events_by_year = build_events_by_year(qs.future())
-        context['events_by_year'] = events_by_year
-        archived_events_by_year = build_events_by_year(qs.archive(),
-                                                       is_archive_view=True)
-        context['archived_events_by_year'] = archived_events_by_year
+        context['events_by_year'] = self.get_events_by_year()
+        context['archived_events_by_year'] = self.get_events_by_year(
+            is_archive_view=True)
         context['event_year'] = self.kwargs.get('year')
         context['event_month'] = self.kwargs.get('month')
         context['event_day'] = self.kwargs.get('day')
         return context
 
+    def get_events_by_year(self, is_archive_view=False):
+        """
+        Returns the year/month navigation structure, shared between requests
+        until an event changes or the day rolls over.
+        """
+        namespace = self.namespace
+        language = self.request_language
+
+        def build():
+            qs = (Event.objects.namespace(namespace)
+                               .active_translations(language)
+                               .language(language))
+            qs = qs.archive() if is_archive_view else qs.future()
+            # only the amount of events per month is needed for the
+            # navigation, so do not load the events themselves
+            return build_events_by_year_from_counts(
+                get_month_event_counts(qs), is_archive_view=is_archive_view)
+
+        loader = get_loader(self.request)
+        key_parts = (namespace, language, loader.get_site_id(),
+                     'archive' if is_archive_view else 'future')
+        return loader.load('navigation', key_parts, lambda: get_or_build(
+            'navigation', key_parts, build,
+            timeout=lambda: get_navigation_cache_timeout(namespace)))
+
+
+def make_outdated(obj):
+    obj.is_outdated = True
+    return obj
+
 
 class EventListView(AppConfigMixin, NavigationMixin, ListView):
     model = Event
@@ -70,10 +109,22 @@ class EventListView(AppConfigMixin, NavigationMixin, ListView):
             settings, 'ALDRYN_EVENTS_PAGINATE_BY', self.paginate_by
         )
 
+    def paginate_queryset(self, queryset, page_size):
+        if not getattr(settings, 'ALDRYN_EVENTS_CURSOR_PAGINATION', False):
+            return super(EventListView, self).paginate_queryset(
+                queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_queryset(self):
         # do not fail and do not try to resolve events if corresponding
         # EventsConfig does not exist (rare situation)
-        if not EventsConfig.objects.filter(namespace=self.namespace).exists():
+        loader = get_loader(self.request)
+        if loader.get_config(self.namespace) is None:
             qs = Event.objects.none()
         else:
             qs = (super(EventListView, self).get_queryset()
@@ -87,11 +138,11 @@ class EventListView(AppConfigMixin, NavigationMixin, ListView):
         day = self.kwargs.get('day')
 
         # prepare language properties for filtering
-        site_id = getattr(get_current_site(self.request), 'id', None)
-        valid_languages = get_valid_languages(
+        site_id = loader.get_site_id()
+        valid_languages = loader.get_valid_languages(
             self.namespace, self.request_language, site_id)
 
-        self.archive_qs = []
+        self.archive_qs = None
 
         if year or month or day:
             if year and month and day:
@@ -108,39 +159,52 @@ class EventListView(AppConfigMixin, NavigationMixin, ListView):
                 first_date = date(year, 1, 1)
                 last_date = first_date + relativedelta(years=1, days=-1)
 
-            filter_args = get_event_q_filters(first_date, last_date)
-            qs = qs.filter(filter_args).published()
+            qs = filter_events_by_dates(
+                qs, first_date, last_date, self.namespace).published()
         else:
             if self.archive:
                 qs = qs.archive()
             else:
                 self.archive_qs = (qs.archive()
                                      .translated(*valid_languages)
-                                     .order_by(*ORDERING_FIELDS))
+                                     .order_by(*ORDERING_FIELDS)
+                                     .for_listing('list'))
                 qs = qs.future()
 
-        qs = qs.translated(*valid_languages)
-        return qs.order_by(*ORDERING_FIELDS).distinct()
+        qs = qs.translated(*valid_languages).order_by(*ORDERING_FIELDS)
+        if self.show_ongoing_first():
+            # ongoing events lead the list and are paginated with it
+            qs = qs.ongoing_first(limit=getattr(
+                settings, 'ALDRYN_EVENTS_ONGOING_FIRST_LIMIT', None))
+        return qs.for_listing('list').distinct()
+
+    def show_ongoing_first(self):
+        return bool(
+            self.config and self.config.app_data.config.show_ongoing_first)
 
     def get_context_data(self, **kwargs):
         object_list = self.object_list
 
-        if self.config and self.config.app_data.config.show_ongoing_first:
-            ongoing_objects = self.object_list.ongoing()
-            object_list = object_list.exclude(
-                pk__in=ongoing_objects.values_list('pk', flat=True)
-            )
-            kwargs['ongoing_objects'] = ongoing_objects
-
-        # add outdated events to end of list
-        def make_outdated(obj):
-            obj.is_outdated = True
-            return obj
-        object_list = list(chain(object_list, map(make_outdated,
-                                                  self.archive_qs)))
+        # add outdated events to end of list, only the rows of the current
+        # page are fetched from the future and the archive querysets
+        if self.archive_qs is not None:
+            object_list = ChainedQuerySets(
+                [object_list, (self.archive_qs, make_outdated)])
         kwargs['object_list'] = object_list
 
-        return super(EventListView, self).get_context_data(**kwargs)
+        context = super(EventListView, self).get_context_data(**kwargs)
+        if self.show_ongoing_first():
+            # split the ongoing events of the page from the others
+            page = context['page_obj']
+            objects = page.object_list if page else context['object_list']
+            ongoing_objects, objects = [], list(objects)
+            while objects and getattr(objects[0], 'is_ongoing', False):
+                ongoing_objects.append(objects.pop(0))
+            if page:
+                page.object_list = objects
+            context['object_list'] = objects
+            context['ongoing_objects'] = ongoing_objects
+        return context
 
 
 class EventDetailView(AppConfigMixin, NavigationMixin, CreateView):
@@ -154,9 +218,10 @@ class EventDetailView(AppConfigMixin, NavigationMixin, CreateView):
         qs = (Event.objects.namespace(self.namespace)
                            .published()
                            .language(self.request_language))
-        site_id = getattr(get_current_site(request), 'id', None)
-        valid_languages = get_valid_languages(
-            self.namespace, self.request_language, site_id)
+        loader = get_loader(request)
+        self.site_id = loader.get_site_id()
+        valid_languages = loader.get_valid_languages(
+            self.namespace, self.request_language, self.site_id)
         self.queryset = qs.translated(*valid_languages).order_by(
             *ORDERING_FIELDS)
         self.event = self.queryset.active_translations(
@@ -173,23 +238,46 @@ class EventDetailView(AppConfigMixin, NavigationMixin, CreateView):
         return super(EventDetailView, self).dispatch(request, *args, **kwargs)
 
     def get_neighbors_events(self):
-        qs = list(self.queryset)
-        length = len(qs)
-        _prev, _next = None, None
+        prev_pk, next_pk = self.get_neighbors_pks()
+        pks = [pk for pk in (prev_pk, next_pk) if pk is not None]
+        events = {}
+        if pks:
+            events = dict(
+                (event.pk, event)
+                for event in self.queryset.filter(pk__in=pks))
+        return events.get(prev_pk), events.get(next_pk)
+
+    def get_neighbors_pks(self):
+        max_timeout = settings.ALDRYN_EVENTS_NEIGHBORS_CACHE_TIMEOUT
+        if not max_timeout:
+            return self.find_neighbors_pks()
+        return get_or_build(
+            'neighbors',
+            (self.namespace, self.request_language, self.site_id,
+             self.event.pk),
+            self.find_neighbors_pks,
+            timeout=lambda: get_events_cache_timeout(
+                self.namespace, max_timeout))
+
+    def find_neighbors_pks(self):
+        """
+        Returns the pks of the events before and after the current one in
+        the ordering of the queryset (ORDERING_FIELDS, reversed for
+        latest_first), each found with a single query.
+        """
+        features = connections[self.queryset.db].features
+        nulls_largest = features.nulls_order_largest
+        descending = not self.queryset.query.standard_ordering
 
-        try:
-            index = qs.index(self.event)
-        except ValueError:
-            # That should not happen, but since this method just help populate
-            # the context, we don't allow it to fail
-            pass
-        else:
-            if index - 1 >= 0:
-                _prev = qs[index - 1]
-            if index + 1 < length:
-                _next = qs[index + 1]
+        values = [getattr(self.event, field) for field in ORDERING_FIELDS]
+
+        def seek(queryset, descending):
+            return queryset.filter(get_seek_q_filters(
+                ORDERING_FIELDS, values, descending, nulls_largest,
+            )).values_list('pk', flat=True).first()
 
-        return _prev, _next
+        return (seek(self.queryset.reverse(), not descending),
+                seek(self.queryset, descending))
 
     def get_context_data(self, **kwargs):
         context = super(EventDetailView, self).get_context_data(**kwargs)
@@ -298,7 +386,72 @@ class EventDatesView(AppConfigMixin, TemplateView):
         return ctx
 
 
+class EventYearCalendarView(AppConfigMixin, TemplateView):
+    """
+    Year at a glance: the calendars of all months of a year, with the amount
+    of events per day.
+    """
+    template_name = 'aldryn_events/events_calendar.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super(EventYearCalendarView, self).get_context_data(**kwargs)
+        year = int(self.kwargs['year'])
+        # the calendars reach into the months before and after the year
+        if not MINYEAR < year < MAXYEAR:
+            raise Http404('Year out of range')
+        language = get_language(self.request)
+        site_id = getattr(get_current_site(self.request), 'id', None)
+        ctx['calendar_year'] = year
+        ctx['last_year'] = year - 1 if year - 1 > MINYEAR else None
+        ctx['next_year'] = year + 1 if year + 1 < MAXYEAR else None
+        ctx['calendars'] = build_calendar_range_context(
+            year, 1, 12, language, self.namespace, site_id)
+        return ctx
+
+
+class EventPluginView(AppConfigMixin, View):
+    """
+    Content of a deferred upcoming or calendar plugin of the namespace (see
+    `cms_plugins.DeferredMixin`), with the scripts it adds to the page. The
+    response can be cached until the content changes.
+    """
+    plugin_types = ('UpcomingPlugin', 'CalendarPlugin')
+
+    def get_plugin(self, pk):
+        plugin = CMSPlugin.objects.filter(
+            pk=pk, plugin_type__in=self.plugin_types).first()
+        instance, plugin_class = (
+            plugin.get_plugin_instance() if plugin else (None, None))
+        if (instance is None or not instance.deferred or
+                instance.app_config_id != self.config.pk):
+            raise Http404('Plugin not found')
+        page = instance.placeholder.page
+        if page is not None and page.publisher_is_draft:
+            raise Http404('Plugin not found')
+        return instance, plugin_class
+
+    def get(self, request, pk):
+        instance, plugin_class = self.get_plugin(pk)
+        context = SekizaiContext({
+            'request': request,
+            'deferred_content': True,
+        })
+        renderer = ContentRenderer(request)
+        content = renderer.render_plugin(
+            instance, context, instance.placeholder)
+        # e.g. the scripts of the calendar
+        blocks = context[get_varname()]
+        content += ''.join(
+            ''.join(blocks[name]) for name in sorted(blocks))
+        response = HttpResponse(content)
+        patch_response_headers(
+            response, plugin_class.get_content_expiration(instance))
+        return response
+
+
 event_dates = EventDatesView.as_view()
+event_plugin = EventPluginView.as_view()
+event_year_calendar = EventYearCalendarView.as_view()
 event_detail = EventDetailView.as_view()
 event_list = EventListView.as_view()
 event_list_archive = EventListView.as_view(archive=True)